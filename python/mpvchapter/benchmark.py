@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Benchmark silence detection pipelines on synthetic test files.
+
+Generates videos with FFmpeg's lavfi sources (a test pattern plus a tone that
+goes silent for a few seconds every minute) and reports the wall-clock time
+each detection pipeline needs per hour of media.
+
+With --parity, a tone/silence WAV fixture with known silences is written and
+the PCM detector (fed directly, and through FFmpeg) and the silencedetect
+parser are checked against it; the exit status is 1 on a mismatch.
+
+With --scenes, slide-like videos (a still picture that changes a few seconds
+into every silence) are used to compare silence detection alone, silence
+detection followed by a separate scene-change pass, and the combined single
+pass, and to check that chapters are snapped to the slide changes.
+
+Usage:
+    python benchmark.py [--durations 300 1800] [--workdir bench_media]
+    python benchmark.py --parity
+    python benchmark.py --scenes
+"""
+
+import argparse
+import array
+import copy
+import io
+import json
+import math
+import shutil
+import subprocess
+import sys
+import time
+import wave
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from mpvchapter import VideoChapterExtractor
+from pcm_detector import PcmSilenceDetector
+
+# Pipelines to compare: name -> detection config overrides
+PIPELINES = {
+    'full-decode': {'fast_analysis': False},
+    'fast-analysis': {'fast_analysis': True},
+    'pcm-engine': {'engine': 'pcm'},
+}
+
+BASE_CONFIG = {
+    'detection': {
+        'noise_threshold_db': -30,
+        'min_silence': 1.0,
+    },
+    'logging': {
+        'level': 'WARNING',
+    },
+}
+
+def generate_fixture(ffmpeg: str, path: Path, duration: int, silence_every: int = 60,
+                     silence_length: int = 5):
+    """Generate a 720p stereo test video with periodic silences."""
+    if path.exists():
+        return
+
+    volume = f"volume=enable='lt(mod(t,{silence_every}),{silence_length})':volume=0"
+    cmd = [
+        ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-af', f'{volume},aformat=channel_layouts=stereo',
+        '-c:v', 'libx264', '-preset', 'ultrafast',
+        '-c:a', 'aac',
+        str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+def generate_slides_fixture(ffmpeg: str, path: Path, duration: int, silence_every: int = 60,
+                            silence_length: int = 5, slide_offset: int = 3):
+    """Generate a 720p slide-like video whose picture changes slide_offset seconds into every silence."""
+    if path.exists():
+        return
+
+    volume = f"volume=enable='lt(mod(t,{silence_every}),{silence_length})':volume=0"
+    hue = f"hue=H=2*PI*floor((t+{silence_every - slide_offset})/{silence_every})/5"
+    cmd = [
+        ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'smptehdbars=size=1280x720:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-vf', hue,
+        '-af', f'{volume},aformat=channel_layouts=stereo',
+        '-c:v', 'libx264', '-preset', 'ultrafast',
+        '-c:a', 'aac',
+        str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+def generate_wav_fixture(path: Path, pattern: List[Tuple[float, bool]], sample_rate: int = 48000):
+    """Write a mono 16-bit WAV of (seconds, is_tone) parts; returns the silences."""
+    samples = array.array('h')
+    silences = []
+    position = 0.0
+    for seconds, is_tone in pattern:
+        count = int(seconds * sample_rate)
+        if is_tone:
+            samples.extend(int(12000 * math.sin(2 * math.pi * 440 * i / sample_rate))
+                           for i in range(count))
+        else:
+            samples.extend([0] * count)
+            silences.append((position, position + seconds))
+        position += seconds
+
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return silences
+
+def detect_wav_in_process(path: Path, noise_threshold_db: float = -30,
+                          min_silence: float = 1.0) -> List[Tuple[float, float]]:
+    """Run the PCM detector directly on the samples of a mono 16-bit WAV, without FFmpeg."""
+    with wave.open(str(path), 'rb') as f:
+        sample_rate = f.getframerate()
+        frames = f.readframes(f.getnframes())
+    detector = PcmSilenceDetector([noise_threshold_db], min_silence, sample_rate=sample_rate)
+    return [(start, end) for start, end, _ in detector.run(io.BytesIO(frames))[noise_threshold_db]]
+
+def check_parity(workdir: Path, ffmpeg: str = 'ffmpeg', tolerance: float = 0.05):
+    """Check the PCM detector and the silencedetect parser against a WAV fixture's known silences.
+
+    Raises AssertionError listing the pipelines that disagree. The in-process
+    check always runs; the FFmpeg pipelines are skipped when FFmpeg is missing.
+    """
+    pattern = [(5, True), (1.5, False), (7, True), (3, False), (4, True),
+               (0.5, False), (6, True), (2.2, False), (3, True)]
+    wav_path = workdir / 'parity.wav'
+    expected = [s for s in generate_wav_fixture(wav_path, pattern) if s[1] - s[0] >= 1.0]
+
+    results = {'pcm-in-process': detect_wav_in_process(wav_path)}
+    if shutil.which(ffmpeg):
+        for name in ('full-decode', 'pcm-engine'):
+            config = copy.deepcopy(BASE_CONFIG)
+            config['detection'].update(PIPELINES[name])
+            extractor = VideoChapterExtractor(config)
+            results[name] = [(seg.start, seg.end) for seg in extractor.detect_silences(str(wav_path))]
+    else:
+        print(f"{ffmpeg} not found, checking the in-process detector only", file=sys.stderr)
+
+    mismatched = []
+    for name, segments in results.items():
+        matches = len(segments) == len(expected) and all(
+            abs(a[0] - b[0]) <= tolerance and abs(a[1] - b[1]) <= tolerance
+            for a, b in zip(segments, expected)
+        )
+        print(f"{name:<16}{'OK' if matches else 'MISMATCH':<10}{segments}")
+        if not matches:
+            mismatched.append(name)
+    print(f"{'expected':<16}{'':<10}{expected}")
+    if mismatched:
+        raise AssertionError(f"silences differ from the fixture: {', '.join(mismatched)}")
+
+def run_pipeline(overrides: Dict[str, Any], video_path: Path) -> Dict[str, Any]:
+    """Time one detection pipeline on one file."""
+    config = copy.deepcopy(BASE_CONFIG)
+    config['detection'].update(overrides)
+    extractor = VideoChapterExtractor(config)
+
+    start = time.perf_counter()
+    silences = extractor.detect_silences(str(video_path))
+    elapsed = time.perf_counter() - start
+
+    return {'elapsed': elapsed, 'silences': len(silences)}
+
+# Scene pipelines: name -> (scenes config, run a separate scene pass)
+SCENE_PIPELINES = {
+    'silence-only': (None, False),
+    'separate-passes': ({'enabled': True}, True),
+    'combined': ({'enabled': True}, False),
+    'combined-keyframes': ({'enabled': True, 'keyframes_only': True}, False),
+}
+
+def run_scene_pipeline(scene_config: Dict[str, Any], separate: bool, video_path: Path,
+                       duration: int, silence_every: int = 60, slide_offset: int = 3) -> Dict[str, Any]:
+    """Time silence (and scene) detection on a slides fixture and score the chapter positions."""
+    config = copy.deepcopy(BASE_CONFIG)
+    config['detection'].update(PIPELINES['fast-analysis'])
+    if scene_config:
+        config['scenes'] = dict(scene_config)
+    extractor = VideoChapterExtractor(config)
+
+    start = time.perf_counter()
+    scenes = []
+    if separate:
+        # 先单独检测静音，再单独运行一次只处理视频流的场景检测
+        silences = extractor.detect_silences(str(video_path), duration)
+        cmd = [extractor.ffmpeg_path, '-hide_banner', '-nostats', '-an', '-sn', '-dn',
+               *extractor.scene_input_args(), '-i', str(video_path), *extractor.scene_output_args()]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        scenes = sorted(float(line.rsplit('pts_time:', 1)[1]) for line in result.stderr.splitlines()
+                        if 'Parsed_metadata' in line and 'pts_time:' in line)
+    else:
+        silences = extractor.detect_silences(str(video_path), duration, scenes if scene_config else None)
+    elapsed = time.perf_counter() - start
+
+    chapters = extractor.generate_chapter_marks(silences, duration, scenes)
+    expected = [t + slide_offset for t in range(silence_every, duration, silence_every)]
+    on_slide = sum(1 for c in chapters[1:] if any(abs(c.time - t) <= 0.5 for t in expected))
+    return {'elapsed': elapsed, 'silences': len(silences), 'scenes': len(scenes),
+            'chapters': len(chapters) - 1, 'on_slide_change': on_slide}
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--durations', type=int, nargs='+', default=[300, 1800],
+                        help='fixture durations in seconds')
+    parser.add_argument('--workdir', default='bench_media',
+                        help='directory for generated fixtures')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='FFmpeg executable')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--parity', action='store_true',
+                        help='check the PCM engine against the silencedetect parser')
+    parser.add_argument('--scenes', action='store_true',
+                        help='compare separate and combined silence/scene-change passes')
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    if args.parity:
+        try:
+            check_parity(workdir, args.ffmpeg)
+        except AssertionError as e:
+            print(f"Parity check failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.scenes:
+        results = []
+        for duration in args.durations:
+            video_path = workdir / f'slides_{duration}s.mp4'
+            print(f"Generating {video_path} ...", file=sys.stderr)
+            generate_slides_fixture(args.ffmpeg, video_path, duration)
+            for name, (scene_config, separate) in SCENE_PIPELINES.items():
+                result = run_scene_pipeline(scene_config, separate, video_path, duration)
+                result.update({'pipeline': name, 'media_seconds': duration})
+                results.append(result)
+
+        if args.json:
+            print(json.dumps(results, indent=2))
+            return
+
+        print(f"{'pipeline':<20}{'media':>8}{'wall (s)':>10}{'scenes':>8}{'chapters':>10}{'on slide':>10}")
+        for r in results:
+            print(f"{r['pipeline']:<20}{r['media_seconds']:>7}s{r['elapsed']:>10.2f}"
+                  f"{r['scenes']:>8}{r['chapters']:>10}{r['on_slide_change']:>10}")
+        return
+
+    results = []
+    for duration in args.durations:
+        video_path = workdir / f'synthetic_{duration}s.mp4'
+        print(f"Generating {video_path} ...", file=sys.stderr)
+        generate_fixture(args.ffmpeg, video_path, duration)
+
+        for name, overrides in PIPELINES.items():
+            result = run_pipeline(overrides, video_path)
+            result.update({
+                'pipeline': name,
+                'media_seconds': duration,
+                'seconds_per_media_hour': result['elapsed'] * 3600 / duration,
+            })
+            results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'pipeline':<16}{'media':>8}{'wall (s)':>10}{'s / media hour':>16}{'silences':>10}")
+    for r in results:
+        print(f"{r['pipeline']:<16}{r['media_seconds']:>7}s{r['elapsed']:>10.2f}"
+              f"{r['seconds_per_media_hour']:>16.2f}{r['silences']:>10}")
+
+if __name__ == '__main__':
+    main()
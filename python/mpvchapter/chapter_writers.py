@@ -0,0 +1,236 @@
+"""
+Output writers for chapter marks.
+
+Each writer turns the chapter marks of one video into one output format:
+
+- chapter:    ``H:MM:SS.mmm Title`` text read by scripts/chapter-converter.lua
+- youtube:    ``H:MM:SS Title`` lines for a YouTube description
+- ffmetadata: FFmpeg metadata, loaded natively by mpv (``chapters-file``)
+- matroska:   Matroska XML chapters for mkvmerge/mkvpropedit
+- embed:      chapters muxed into the video itself with an ``-c copy`` remux
+
+A batch can enable several writers at once; they all share one detection
+pass. Files are written to a temporary file and renamed, so a player never
+sees a half-written output.
+"""
+
+import os
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+def format_timestamp(seconds: float) -> str:
+    """Format time as MM:SS.mmm, or H:MM:SS.mmm from one hour on."""
+    if seconds < 0:
+        seconds = 0
+
+    total_ms = int(seconds * 1000 + 0.5)
+    hh = total_ms // 3600000
+    mm = (total_ms % 3600000) // 60000
+    ss = (total_ms % 60000) // 1000
+    ms = total_ms % 1000
+
+    if hh:
+        return f"{hh}:{mm:02d}:{ss:02d}.{ms:03d}"
+    return f"{mm:02d}:{ss:02d}.{ms:03d}"
+
+def chapter_ends(chapters: List[Any], duration: Optional[float]) -> List[float]:
+    """End time of every chapter: the next chapter's start, or the video end."""
+    ends = [chapter.time for chapter in chapters[1:]]
+    if chapters:
+        last = chapters[-1].time
+        ends.append(max(duration, last) if duration else last)
+    return ends
+
+def write_atomic(path: Path, content: str, encoding: str = 'utf-8'):
+    """Write a text file through a temporary file and rename it into place."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding=encoding) as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+class ChapterWriter:
+    """Base class of the file-based writers."""
+
+    name = ''
+    default_suffix = ''
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        self.encoding = options.get('encoding', 'utf-8')
+
+    @property
+    def suffix(self) -> str:
+        return self.default_suffix
+
+    def output_path(self, video_path: Path) -> Optional[Path]:
+        """Path of the file written for a video (None if nothing is written)."""
+        # Append suffix to original filename: filename.ext.chapter
+        return video_path.parent / (video_path.name + self.suffix)
+
+    def render(self, chapters: List[Any], duration: Optional[float]) -> str:
+        raise NotImplementedError
+
+    def write(self, video_path: Path, chapters: List[Any], duration: Optional[float]) -> Path:
+        path = self.output_path(video_path)
+        write_atomic(path, self.render(chapters, duration), self.encoding)
+        return path
+
+class TextWriter(ChapterWriter):
+    """The ``.chapter`` text format used by chapter-converter.lua."""
+
+    name = 'chapter'
+    default_suffix = '.chapter'
+
+    @property
+    def suffix(self) -> str:
+        return self.options.get('suffix', self.default_suffix)
+
+    def render(self, chapters: List[Any], duration: Optional[float]) -> str:
+        return '\n'.join(f"{format_timestamp(c.time)} {c.title}" for c in chapters)
+
+class YouTubeWriter(ChapterWriter):
+    """Whole-second timestamps as expected in a YouTube description."""
+
+    name = 'youtube'
+    default_suffix = '.youtube.txt'
+
+    def render(self, chapters: List[Any], duration: Optional[float]) -> str:
+        lines = []
+        for c in chapters:
+            # YouTube 截断到整秒，多个章节落在同一秒时只保留第一个
+            hh, rest = divmod(int(max(c.time, 0)), 3600)
+            mm, ss = divmod(rest, 60)
+            stamp = f"{hh}:{mm:02d}:{ss:02d}" if hh else f"{mm}:{ss:02d}"
+            if lines and lines[-1].split(' ', 1)[0] == stamp:
+                continue
+            lines.append(f"{stamp} {c.title}")
+        return '\n'.join(lines) + '\n'
+
+class FFMetadataWriter(ChapterWriter):
+    """FFmpeg metadata file, loaded by mpv as ``<video>.ext.ffmetadata``."""
+
+    name = 'ffmetadata'
+    default_suffix = '.ffmetadata'
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        for char in ('\\', '=', ';', '#', '\n'):
+            value = value.replace(char, '\\' + char)
+        return value
+
+    def render(self, chapters: List[Any], duration: Optional[float]) -> str:
+        # 与 chapters.lua 写出的文件一致使用纳秒，chapter-converter.lua 按纳秒读取 START
+        lines = [';FFMETADATA1']
+        for c, end in zip(chapters, chapter_ends(chapters, duration)):
+            lines += [
+                '',
+                '[CHAPTER]',
+                'TIMEBASE=1/1000000000',
+                f'START={int(round(max(c.time, 0) * 1e9))}',
+                f'END={int(round(max(end, 0) * 1e9))}',
+                f'title={self._escape(c.title)}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+class MatroskaWriter(ChapterWriter):
+    """Matroska XML chapters for mkvmerge --chapters or mkvpropedit."""
+
+    name = 'matroska'
+    default_suffix = '.chapters.xml'
+
+    @staticmethod
+    def _timestamp(seconds: float) -> str:
+        total_ns = int(round(max(seconds, 0) * 1e9))
+        hh, rest = divmod(total_ns, 3600 * 10**9)
+        mm, rest = divmod(rest, 60 * 10**9)
+        ss, ns = divmod(rest, 10**9)
+        return f"{hh:02d}:{mm:02d}:{ss:02d}.{ns:09d}"
+
+    def render(self, chapters: List[Any], duration: Optional[float]) -> str:
+        language = self.options.get('language', 'und')
+        lines = [
+            f'<?xml version="1.0" encoding="{self.encoding}"?>',
+            '<!DOCTYPE Chapters SYSTEM "matroskachapters.dtd">',
+            '<Chapters>',
+            '  <EditionEntry>',
+        ]
+        for c, end in zip(chapters, chapter_ends(chapters, duration)):
+            lines += [
+                '    <ChapterAtom>',
+                f'      <ChapterTimeStart>{self._timestamp(c.time)}</ChapterTimeStart>',
+                f'      <ChapterTimeEnd>{self._timestamp(end)}</ChapterTimeEnd>',
+                '      <ChapterDisplay>',
+                f'        <ChapterString>{escape(c.title)}</ChapterString>',
+                f'        <ChapterLanguage>{language}</ChapterLanguage>',
+                '      </ChapterDisplay>',
+                '    </ChapterAtom>',
+            ]
+        lines += ['  </EditionEntry>', '</Chapters>']
+        return '\n'.join(lines) + '\n'
+
+class EmbedWriter(ChapterWriter):
+    """Mux the chapters into the video itself with a stream-copy remux.
+
+    The remux goes to a temporary file next to the video that replaces the
+    original only after FFmpeg succeeded. Existing chapters are replaced,
+    all streams and global metadata are kept.
+    """
+
+    name = 'embed'
+
+    def __init__(self, options: Dict[str, Any], ffmpeg: str = 'ffmpeg',
+                 run: Optional[Callable[[List[str]], int]] = None):
+        super().__init__(options)
+        self.ffmpeg = ffmpeg
+        self.run = run or (lambda cmd: subprocess.run(cmd).returncode)
+
+    def output_path(self, video_path: Path) -> Optional[Path]:
+        return None
+
+    def write(self, video_path: Path, chapters: List[Any], duration: Optional[float]) -> Path:
+        metadata_path = video_path.with_name(video_path.name + '.embed.ffmetadata')
+        # 临时文件保留原扩展名，FFmpeg 根据扩展名选择封装格式
+        tmp_path = video_path.with_name(f".{video_path.stem}.embed{video_path.suffix}")
+        write_atomic(metadata_path, FFMetadataWriter(self.options).render(chapters, duration))
+        cmd = [
+            self.ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+            '-i', str(video_path),
+            '-f', 'ffmetadata', '-i', str(metadata_path),
+            '-map', '0', '-map_metadata', '0', '-map_chapters', '1',
+            '-c', 'copy',
+            str(tmp_path),
+        ]
+        try:
+            returncode = self.run(cmd)
+            if returncode != 0:
+                raise RuntimeError(f"FFmpeg remux failed with exit code {returncode}")
+            os.replace(tmp_path, video_path)
+        finally:
+            for path in (metadata_path, tmp_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        return video_path
+
+WRITERS = {
+    writer.name: writer
+    for writer in (TextWriter, YouTubeWriter, FFMetadataWriter, MatroskaWriter, EmbedWriter)
+}
+
+def create_writers(formats: List[str], options: Dict[str, Any], ffmpeg: str = 'ffmpeg',
+                   run: Optional[Callable[[List[str]], int]] = None) -> List[ChapterWriter]:
+    """Instantiate the writers for a list of format names, in order."""
+    writers = []
+    for name in formats:
+        if name not in WRITERS:
+            raise ValueError(f"Unknown output format: {name} (available: {', '.join(WRITERS)})")
+        if name == 'embed':
+            writers.append(EmbedWriter(options, ffmpeg, run))
+        else:
+            writers.append(WRITERS[name](options))
+    # 嵌入会改写视频文件本身，放在最后执行
+    writers.sort(key=lambda w: w.name == 'embed')
+    return writers
@@ -0,0 +1,162 @@
+"""
+Lazy discovery of input files.
+
+A single os.scandir walk yields every file that matches the input pattern as
+soon as it is seen, so processing can start before a large tree has been
+fully listed. Patterns support nested brace groups (``*.{mp4,m{kv,ov}}``)
+and match case-insensitively. Exclude patterns prune whole directories.
+Hidden entries are skipped, and each file is reported once even when
+patterns overlap or symlinks lead to it twice. Symlinked directories are
+only followed on request, and each directory is entered at most once, so
+symlink loops terminate.
+"""
+
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+def expand_braces(pattern: str) -> List[str]:
+    """Expand every ``{a,b}`` group of a pattern: ``*.{mp4,mkv}`` -> ``*.mp4``, ``*.mkv``."""
+    start = pattern.find('{')
+    if start == -1:
+        return [pattern]
+
+    # 找到与之配对的 '}'，支持嵌套
+    depth = 0
+    for end in range(start, len(pattern)):
+        if pattern[end] == '{':
+            depth += 1
+        elif pattern[end] == '}':
+            depth -= 1
+            if depth == 0:
+                break
+    else:
+        return [pattern]
+
+    options, depth, current = [], 0, ''
+    for char in pattern[start + 1:end]:
+        if char == ',' and depth == 0:
+            options.append(current)
+            current = ''
+            continue
+        depth += (char == '{') - (char == '}')
+        current += char
+    options.append(current)
+
+    expanded = []
+    for option in options:
+        for item in expand_braces(pattern[:start] + option.strip() + pattern[end + 1:]):
+            if item not in expanded:
+                expanded.append(item)
+    return expanded
+
+class PatternSet:
+    """Case-insensitive glob patterns with brace groups.
+
+    Patterns without a '/' match the file name; patterns with one match the
+    path relative to the search root. A leading ``**/`` matches at any depth.
+    """
+
+    def __init__(self, patterns: Union[str, Iterable[str]]):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        names, paths = [], []
+        for pattern in patterns:
+            for item in expand_braces(pattern):
+                item = item.replace('\\', '/').lower()
+                while item.startswith('**/'):
+                    item = item[3:]
+                (paths if '/' in item else names).append(fnmatch.translate(item))
+        self._name = re.compile('|'.join(names)) if names else None
+        self._path = re.compile('|'.join(paths)) if paths else None
+
+    def __bool__(self) -> bool:
+        return bool(self._name or self._path)
+
+    def match(self, name: str, relative: str) -> bool:
+        if self._name and self._name.match(name.lower()):
+            return True
+        return bool(self._path and self._path.match(relative.lower()))
+
+def pattern_matcher(pattern: str) -> Callable[[str], bool]:
+    """Case-insensitive file name matcher for a glob pattern with brace groups."""
+    patterns = PatternSet(pattern)
+    return lambda name: patterns.match(name, name)
+
+def discover(root: Union[str, Path], pattern: Union[str, Iterable[str]] = '*',
+             recursive: bool = False, exclude: Iterable[str] = (),
+             follow_symlinks: bool = False, include_hidden: bool = False) -> Iterator[Path]:
+    """Yield the files under root that match pattern, directory by directory.
+
+    Entries of each directory are visited in name order, subdirectories
+    depth first. Unreadable directories are skipped.
+    """
+    include = PatternSet(pattern)
+    excluded = PatternSet(exclude)
+    root = Path(root)
+
+    try:
+        root_stat = root.stat()
+    except OSError:
+        return
+    visited: Set[Tuple[int, int]] = {(root_stat.st_dev, root_stat.st_ino)}
+    seen: Set[Tuple[int, int]] = set()
+    # (目录, 相对路径前缀, 设备号)
+    stack: List[Tuple[str, str, int]] = [(str(root), '', root_stat.st_dev)]
+
+    while stack:
+        directory, prefix, device = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if not include_hidden and entry.name.startswith('.'):
+                continue
+            relative = prefix + entry.name
+            if excluded and excluded.match(entry.name, relative):
+                continue
+
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if not recursive:
+                        continue
+                    stat = entry.stat(follow_symlinks=follow_symlinks)
+                    key = (stat.st_dev, stat.st_ino)
+                    # 符号链接可能指回上层目录，每个目录只进入一次
+                    if key not in visited:
+                        visited.add(key)
+                        subdirs.append((entry.path, relative + '/', stat.st_dev))
+                    continue
+                if not entry.is_file() or not include.match(entry.name, relative):
+                    continue
+                if entry.is_symlink():
+                    stat = entry.stat()
+                    key = (stat.st_dev, stat.st_ino)
+                else:
+                    # 普通文件的 inode 来自目录项，不需要额外的 stat
+                    key = (device, entry.inode())
+            except OSError:
+                continue
+
+            if key in seen:
+                continue
+            seen.add(key)
+            yield Path(entry.path)
+
+        stack.extend(reversed(subdirs))
+
+def discover_inputs(input_config: dict, pattern: Optional[str] = None) -> Iterator[Path]:
+    """discover() with the options of an ``input`` configuration section."""
+    return discover(
+        input_config.get('path', '.'),
+        pattern or input_config.get('pattern', '*.mp4'),
+        recursive=input_config.get('recursive', False),
+        exclude=input_config.get('exclude', []),
+        follow_symlinks=input_config.get('follow_symlinks', False),
+    )
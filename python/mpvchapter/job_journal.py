@@ -0,0 +1,125 @@
+"""
+Append-only journal of batch jobs so an interrupted run can be resumed.
+
+Every state change (queued, running, done, failed) of every input is appended
+to a JSONL file and flushed to disk immediately. A restarted run replays the
+journal, skips inputs that already finished with the same configuration and
+an unchanged file, and processes everything else again. Once a batch finishes
+without failures the journal is removed, so the next run starts fresh.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class JobJournal:
+    """Durable per-input job states for one batch."""
+
+    def __init__(self, path: str, config_hash: str):
+        self.path = Path(path)
+        self.config_hash = config_hash
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = self._replay()
+        self._compact()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest record of every input, ignoring a torn last line."""
+        states = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 进程被杀死时最后一行可能只写了一半
+                        continue
+                    if record.get('config_hash') == self.config_hash:
+                        states[record['input']] = record
+        except FileNotFoundError:
+            pass
+        return states
+
+    def _compact(self):
+        """Rewrite the journal with only the latest record of every input."""
+        if not self._states and not self.path.exists():
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self._states.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(input_path: Path) -> str:
+        return str(Path(input_path).resolve())
+
+    def record(self, input_path: Path, state: str, error: Optional[str] = None):
+        """Append a state change; callers may use states of their own besides the four above."""
+        record = {
+            'input': self._key(input_path),
+            'state': state,
+            'config_hash': self.config_hash,
+            'time': time.time(),
+        }
+        if state == DONE:
+            stat = Path(input_path).stat()
+            record['size'] = stat.st_size
+            record['mtime_ns'] = stat.st_mtime_ns
+        if error:
+            record['error'] = error
+
+        with self._lock:
+            self._states[record['input']] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def state(self, input_path: Path) -> Optional[str]:
+        """Last recorded state of an input, or None if it was never queued."""
+        with self._lock:
+            record = self._states.get(self._key(input_path))
+        return record['state'] if record else None
+
+    def is_done(self, input_path: Path) -> bool:
+        """Check whether an input finished and has not changed since."""
+        with self._lock:
+            record = self._states.get(self._key(input_path))
+        if not record or record['state'] != DONE:
+            return False
+        try:
+            stat = Path(input_path).stat()
+        except OSError:
+            return False
+        return record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns
+
+    def queued(self, input_path: Path):
+        self.record(input_path, QUEUED)
+
+    def running(self, input_path: Path):
+        self.record(input_path, RUNNING)
+
+    def done(self, input_path: Path):
+        self.record(input_path, DONE)
+
+    def failed(self, input_path: Path, error: Optional[str] = None):
+        self.record(input_path, FAILED, error)
+
+    def close(self, completed: bool = False):
+        """Close the journal, deleting it when the whole batch succeeded."""
+        with self._lock:
+            self._file.close()
+        if completed:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
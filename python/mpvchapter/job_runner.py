@@ -0,0 +1,316 @@
+"""
+Resource-governed execution of FFmpeg child processes.
+
+Every job is started in its own process group, so a timeout or Ctrl+C kills
+FFmpeg together with anything it started. The limits of a job are:
+
+- timeout:       wall-clock seconds after which the job is killed
+- stall_timeout: seconds without CPU progress after which the job is killed
+                 (a hung read on a broken file or network share)
+- nice:          CPU scheduling priority (0-19)
+- ionice_class / ionice_level: IO scheduling class (1 realtime, 2 best-effort,
+                 3 idle) and level (0-7), applied through util-linux ionice
+- memory_mb:     RLIMIT_AS cap; allocations beyond it fail and FFmpeg exits
+                 instead of pushing the machine into swap
+- cpu_budget:    CPU threads that the jobs of a runner may use at once; a job
+                 that does not fit waits until others finish (it is throttled).
+                 Jobs started without a budget neither wait nor count towards it
+
+Limits the platform does not support are skipped: on Windows only the
+priority and the timeouts apply, and the memory cap needs Linux (prlimit). CPU progress is sampled through psutil or
+/proc; where neither is available the stall timeout is not applied. Killed
+and throttled jobs are recorded and summarised at the end of a batch.
+"""
+
+import dataclasses
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from telemetry import sample_process
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块
+    resource = None
+
+# 发送 SIGTERM 后等待多少秒再强制结束
+KILL_GRACE = 5.0
+
+class JobKilled(RuntimeError):
+    """A job was killed because it exceeded its timeout or stopped making progress."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} killed: {reason}")
+        self.name = name
+        self.reason = reason
+
+@dataclass
+class ResourceLimits:
+    """Limits applied to each job; None (or 0 for nice) means unlimited."""
+    timeout: Optional[float] = None
+    stall_timeout: Optional[float] = None
+    nice: int = 0
+    ionice_class: Optional[int] = None
+    ionice_level: Optional[int] = None
+    memory_mb: Optional[int] = None
+    cpu_budget: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ResourceLimits':
+        """Read a ``limits`` configuration section; 0 disables a limit."""
+        return cls(
+            timeout=config.get('timeout_seconds') or None,
+            stall_timeout=config.get('stall_seconds') or None,
+            nice=config.get('nice', 0),
+            ionice_class=config.get('ionice_class') or None,
+            ionice_level=config.get('ionice_level'),
+            memory_mb=config.get('memory_mb') or None,
+            cpu_budget=config.get('cpu_budget') or None,
+        )
+
+    def replace(self, **changes) -> 'ResourceLimits':
+        return dataclasses.replace(self, **changes)
+
+@dataclass
+class JobRecord:
+    """What happened to one job."""
+    name: str
+    cpus: int
+    limits: ResourceLimits
+    started: float = 0.0
+    waited: float = 0.0
+    # 计入 CPU 预算的核心数，没有预算的任务不占用
+    reserved: int = 0
+    killed: Optional[str] = None
+    # 以下字段由监视线程使用
+    cpu: Optional[float] = None
+    progressed: float = 0.0
+    kill_deadline: Optional[float] = None
+
+class JobRunner:
+    """Starts child processes under resource limits and kills the ones that exceed them."""
+
+    def __init__(self, limits: Optional[ResourceLimits] = None, logger=None, poll_interval: float = 0.5):
+        self.limits = limits or ResourceLimits()
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._running: Dict[subprocess.Popen, JobRecord] = {}
+        self._in_use = 0
+        self._stopping = False
+        self._watchdog: Optional[threading.Thread] = None
+        self.history: List[JobRecord] = []
+
+    def _log(self, level: str, message: str):
+        if self.logger:
+            getattr(self.logger, level)(message)
+        elif level != 'debug':
+            print(message)
+
+    # ---- 启动 ----
+
+    def _acquire(self, record: JobRecord):
+        """Wait until the job fits into the CPU budget of its limits (if it has one)."""
+        budget = record.limits.cpu_budget
+        began = time.monotonic()
+        with self._condition:
+            if budget:
+                # 没有任务运行时总是允许启动，避免单个任务超出预算而卡住
+                self._condition.wait_for(
+                    lambda: self._stopping or self._in_use == 0 or self._in_use + record.cpus <= budget)
+            if self._stopping:
+                raise RuntimeError("Processing has been stopped")
+            record.reserved = record.cpus if budget else 0
+            self._in_use += record.reserved
+        record.waited = time.monotonic() - began
+        if record.waited >= 1.0:
+            self._log('info', f"Throttled {record.name}: waited {record.waited:.1f}s for CPU budget")
+
+    @staticmethod
+    def _command(cmd: List[str], limits: ResourceLimits) -> List[str]:
+        if os.name == 'nt' or not limits.ionice_class or not shutil.which('ionice'):
+            return cmd
+        prefix = ['ionice', '-c', str(limits.ionice_class)]
+        # idle 类没有级别
+        if limits.ionice_level is not None and limits.ionice_class != 3:
+            prefix.extend(['-n', str(limits.ionice_level)])
+        return prefix + cmd
+
+    def _apply_limits(self, pid: int, limits: ResourceLimits):
+        """Lower the priority and cap the address space of a started child.
+
+        Applied from the parent right after the spawn rather than in a
+        preexec_fn, which is not safe while other threads are running. FFmpeg
+        starts its worker threads after opening the input, so they inherit the
+        priority.
+        """
+        try:
+            if limits.nice:
+                nice = min(19, os.getpriority(os.PRIO_PROCESS, 0) + limits.nice)
+                os.setpriority(os.PRIO_PROCESS, pid, nice)
+            # prlimit 只有 Linux 提供，其他平台不限制内存
+            if limits.memory_mb and hasattr(resource, 'prlimit'):
+                cap = int(limits.memory_mb) * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (cap, cap))
+        except OSError as e:
+            # 进程已经退出，或没有权限修改
+            self._log('debug', f"Could not apply limits to process {pid}: {e}")
+
+    def start(self, cmd: List[str], name: Optional[str] = None, cpus: int = 1,
+              limits: Optional[ResourceLimits] = None, **kwargs) -> subprocess.Popen:
+        """Start a job once it fits into the CPU budget; pass the process to finish() afterwards."""
+        limits = limits or self.limits
+        record = JobRecord(name or os.path.basename(cmd[0]), max(1, int(cpus)), limits)
+        self._acquire(record)
+
+        try:
+            if os.name == 'nt':
+                flags = kwargs.pop('creationflags', 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+                if limits.nice:
+                    flags |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+                process = subprocess.Popen(cmd, creationflags=flags, **kwargs)
+            else:
+                process = subprocess.Popen(self._command(cmd, limits), start_new_session=True, **kwargs)
+                self._apply_limits(process.pid, limits)
+        except BaseException:
+            self._release(record)
+            raise
+
+        record.started = record.progressed = time.monotonic()
+        process.job = record
+        with self._condition:
+            self._running[process] = record
+            if (limits.timeout or limits.stall_timeout) and not self._watchdog:
+                self._watchdog = threading.Thread(target=self._watch, daemon=True)
+                self._watchdog.start()
+        return process
+
+    # ---- 结束 ----
+
+    def _release(self, record: JobRecord):
+        with self._condition:
+            self._in_use -= record.reserved
+            self._condition.notify_all()
+
+    def finish(self, process: subprocess.Popen) -> JobRecord:
+        """Stop tracking a job that has exited (killing it first if it has not) and release its CPUs."""
+        if process.poll() is None:
+            self.kill(process)
+            process.wait()
+        with self._condition:
+            record = self._running.pop(process, None)
+        if record is None:
+            return getattr(process, 'job', None)
+        self._release(record)
+        if record.killed or record.waited >= 1.0:
+            with self._condition:
+                self.history.append(record)
+        return record
+
+    @staticmethod
+    def check(process: subprocess.Popen):
+        """Raise JobKilled if the runner killed the job for exceeding a limit."""
+        record = getattr(process, 'job', None)
+        if record and record.killed and record.killed != 'stopped':
+            raise JobKilled(record.name, record.killed)
+
+    def _signal(self, process: subprocess.Popen, force: bool = False):
+        try:
+            if os.name == 'nt':
+                process.kill() if force else process.terminate()
+            else:
+                # 进程组号等于子进程号（start_new_session）
+                os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+
+    def kill(self, process: subprocess.Popen, reason: Optional[str] = None):
+        """Terminate the process group of a job, escalating to SIGKILL after a grace period."""
+        record = getattr(process, 'job', None)
+        if record and reason and not record.killed:
+            record.killed = reason
+        self._signal(process)
+        try:
+            process.wait(timeout=KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            self._signal(process, force=True)
+
+    @property
+    def stopping(self) -> bool:
+        """Whether stop() has been called; jobs failing from then on were interrupted."""
+        return self._stopping
+
+    def stop(self):
+        """Kill every running job and refuse to start new ones."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            processes = list(self._running)
+        for process in processes:
+            if process.poll() is None:
+                process.job.killed = process.job.killed or 'stopped'
+                self._signal(process)
+        for process in processes:
+            try:
+                process.wait(timeout=KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                self._signal(process, force=True)
+
+    # ---- 监视 ----
+
+    def _over_limit(self, record: JobRecord, pid: int, now: float) -> Optional[str]:
+        limits = record.limits
+        if limits.timeout and now - record.started > limits.timeout:
+            return f"timeout after {limits.timeout:.0f}s"
+        if limits.stall_timeout:
+            cpu, _ = sample_process(pid)
+            if cpu is None:
+                return None
+            if record.cpu is None or cpu > record.cpu:
+                record.cpu = cpu
+                record.progressed = now
+            elif now - record.progressed > limits.stall_timeout:
+                return f"no progress for {limits.stall_timeout:.0f}s"
+        return None
+
+    def _watch(self):
+        """Kill jobs past their wall-clock or no-progress timeout."""
+        while True:
+            time.sleep(self.poll_interval)
+            with self._condition:
+                running = list(self._running.items())
+            now = time.monotonic()
+            for process, record in running:
+                if process.poll() is not None:
+                    continue
+                if record.kill_deadline is not None:
+                    if now >= record.kill_deadline:
+                        self._signal(process, force=True)
+                    continue
+                reason = self._over_limit(record, process.pid, now)
+                if reason:
+                    record.killed = reason
+                    record.kill_deadline = now + KILL_GRACE
+                    self._log('warning', f"Killing {record.name}: {reason}")
+                    self._signal(process)
+
+    # ---- 报告 ----
+
+    def summary(self) -> List[str]:
+        """One line per job that was throttled or killed since the runner was created."""
+        with self._condition:
+            history = list(self.history)
+        lines = []
+        for record in history:
+            if record.killed:
+                lines.append(f"killed     {record.name}: {record.killed}")
+            else:
+                lines.append(f"throttled  {record.name}: waited {record.waited:.1f}s for {record.cpus} CPUs")
+        return lines
@@ -0,0 +1,87 @@
+"""
+Manifest of generated chapter files for incremental batch runs.
+
+A manifest file is kept in every directory that receives chapter files. It
+records the size and modification time of each processed video together with
+a hash of the configuration that produced the output, so unchanged videos can
+be skipped on the next run.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+class ChapterManifest:
+    """Per-directory record of up-to-date chapter outputs."""
+
+    VERSION = 1
+
+    def __init__(self, filename: str, config_hash: str):
+        self.filename = filename
+        self.config_hash = config_hash
+        self._entries: Dict[Path, Dict[str, Any]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _load(self, directory: Path) -> Dict[str, Any]:
+        """Load (once) and return the entries of the manifest in a directory."""
+        if directory not in self._entries:
+            entries = {}
+            manifest_path = directory / self.filename
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    entries = data.get('files', {})
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError):
+                # 损坏的清单视为空，所有文件都会重新处理
+                pass
+            self._entries[directory] = entries
+        return self._entries[directory]
+
+    def is_up_to_date(self, video_path: Path, output_path: Path) -> bool:
+        """Check whether the chapter output for a video is current."""
+        if not output_path.exists():
+            return False
+
+        try:
+            stat = video_path.stat()
+        except OSError:
+            return False
+
+        with self._lock:
+            entry = self._load(video_path.parent).get(video_path.name)
+
+        return (entry is not None and
+                entry.get('size') == stat.st_size and
+                entry.get('mtime_ns') == stat.st_mtime_ns and
+                entry.get('config_hash') == self.config_hash and
+                entry.get('output') == output_path.name)
+
+    def record(self, video_path: Path, output_path: Path):
+        """Record a successfully processed video."""
+        stat = video_path.stat()
+        with self._lock:
+            self._load(video_path.parent)[video_path.name] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'config_hash': self.config_hash,
+                'output': output_path.name,
+            }
+            self._dirty.add(video_path.parent)
+
+    def save(self):
+        """Write all modified manifests atomically."""
+        with self._lock:
+            for directory in sorted(self._dirty):
+                manifest_path = directory / self.filename
+                tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+                data = {'version': self.VERSION, 'files': self._entries[directory]}
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False, sort_keys=True)
+                os.replace(tmp_path, manifest_path)
+            self._dirty.clear()
@@ -0,0 +1,383 @@
+"""
+Shared FFprobe metadata service for mpvchapter and video_reencoder.
+
+The FFmpeg/FFprobe binaries are resolved once per process and their paths and
+version are cached on disk next to the probe results, keyed by the binary's
+size and modification time. Media files are probed with a single
+ffprobe call that returns duration, bitrate and every stream; many files are
+probed concurrently with a bounded thread pool. Results are stored in SQLite
+keyed by resolved path, size and modification time, so a file is probed only
+once across runs and across both tools (they share the default cache path).
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PROBE_ENTRIES = (
+    'format=duration,bit_rate,format_name'
+    ':stream=index,codec_type,codec_name,width,height,bit_rate,sample_rate,channels,duration'
+    ':stream_disposition=attached_pic'
+)
+
+# 内存中最多保留的探测结果数；常驻进程（监视目录、worker 模式）遇到的文件再多也不会无限增长
+MEMO_ENTRIES = 4096
+
+class ProbeError(RuntimeError):
+    """FFprobe failed or returned unusable output."""
+
+def default_cache_path() -> Path:
+    """Per-user cache database shared by all tools in this repository."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return Path(base) / 'mpv-config' / 'probe.db'
+
+def _number(value: Any, kind=float) -> Optional[Any]:
+    """Convert an ffprobe field, which may be missing or 'N/A'."""
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class StreamInfo:
+    """One stream of a media file."""
+    index: int
+    codec_type: str
+    codec_name: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bit_rate: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    duration: Optional[float] = None
+    attached_pic: bool = False
+
+@dataclass
+class MediaInfo:
+    """Container and stream metadata of a media file."""
+    path: str
+    size: int
+    duration: Optional[float]
+    bit_rate: Optional[float]
+    format_name: Optional[str]
+    streams: List[StreamInfo] = field(default_factory=list)
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        """The main video stream (cover art is skipped)."""
+        return next((s for s in self.streams
+                     if s.codec_type == 'video' and not s.attached_pic), None)
+
+    @property
+    def audio(self) -> List[StreamInfo]:
+        return [s for s in self.streams if s.codec_type == 'audio']
+
+    @property
+    def video_bit_rate(self) -> Optional[float]:
+        """Video bitrate, falling back to the container bitrate or file size."""
+        video = self.video
+        if video and video.bit_rate:
+            return video.bit_rate
+        # MKV 等容器没有单独的视频码率，退而使用整体码率
+        if self.bit_rate:
+            return self.bit_rate
+        if self.duration:
+            return self.size * 8 / self.duration
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MediaInfo':
+        data = dict(data)
+        data['streams'] = [StreamInfo(**s) for s in data.get('streams', [])]
+        return cls(**data)
+
+    @classmethod
+    def from_ffprobe(cls, path: str, size: int, data: Dict[str, Any]) -> 'MediaInfo':
+        fmt = data.get('format', {})
+        streams = [
+            StreamInfo(
+                index=int(s.get('index', i)),
+                codec_type=s.get('codec_type', ''),
+                codec_name=s.get('codec_name'),
+                width=_number(s.get('width'), int),
+                height=_number(s.get('height'), int),
+                bit_rate=_number(s.get('bit_rate')),
+                sample_rate=_number(s.get('sample_rate'), int),
+                channels=_number(s.get('channels'), int),
+                duration=_number(s.get('duration')),
+                attached_pic=bool(s.get('disposition', {}).get('attached_pic')),
+            )
+            for i, s in enumerate(data.get('streams', []))
+        ]
+        return cls(path, size, _number(fmt.get('duration')), _number(fmt.get('bit_rate')),
+                   fmt.get('format_name'), streams)
+
+@dataclass
+class Toolchain:
+    """Resolved FFmpeg/FFprobe binaries."""
+    ffmpeg: str
+    ffprobe: str
+    version: str
+
+def _candidates(name: str) -> List[str]:
+    """Places to look for an FFmpeg binary, most specific first."""
+    exe = name + '.exe' if os.name == 'nt' else name
+    candidates = [shutil.which(name)]
+    if os.name == 'nt':
+        program_files = os.environ.get('PROGRAMFILES', 'C:\\Program Files')
+        candidates.append(os.path.join(program_files, 'ffmpeg', 'bin', exe))
+    return [c for c in candidates if c and os.path.isfile(c)]
+
+class ProbeCache:
+    """SQLite store of probe results and resolved tools."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS probes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_probes_last_used ON probes (last_used);
+        CREATE TABLE IF NOT EXISTS tools (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 20000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys: List[Tuple[str, int, int]]) -> Dict[str, Dict[str, Any]]:
+        """Return the stored data of every (path, size, mtime_ns) key that matches."""
+        found = {}
+        with self._lock, self._connect() as conn:
+            for path, size, mtime_ns in keys:
+                row = conn.execute(
+                    "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (path, size, mtime_ns)
+                ).fetchone()
+                if row:
+                    found[path] = json.loads(row[0])
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE probes SET last_used = ? WHERE path = ?",
+                                 [(now, path) for path in found])
+        return found
+
+    def put_many(self, entries: List[Tuple[Tuple[str, int, int], Dict[str, Any]]]):
+        """Store probe results and evict least recently used entries."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            # path 为主键，文件变化后旧结果直接被替换
+            conn.executemany(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                [(path, size, mtime_ns, json.dumps(data), now)
+                 for (path, size, mtime_ns), data in entries]
+            )
+            conn.execute(
+                "DELETE FROM probes WHERE rowid NOT IN "
+                "(SELECT rowid FROM probes ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def get_tool(self, key: Tuple[str, int, int]) -> Optional[Dict[str, Any]]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM tools WHERE path = ? AND size = ? AND mtime_ns = ?", key
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_tool(self, key: Tuple[str, int, int], data: Dict[str, Any]):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO tools VALUES (?, ?, ?, ?)",
+                         key + (json.dumps(data),))
+
+def _fingerprint(path: str) -> Tuple[str, int, int]:
+    """Identify a file by resolved path, size and modification time."""
+    stat = os.stat(path)
+    return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
+
+class MetadataService:
+    """Long-lived prober: resolves the binaries once and caches every result.
+
+    The binaries are resolved on first use, so constructing a service never
+    fails; ``tools`` raises RuntimeError when FFmpeg is not installed.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, workers: int = 8,
+                 ffmpeg: Optional[str] = None, timeout: float = 60,
+                 max_entries: int = 20000):
+        self.cache = ProbeCache(cache_path, max_entries) if cache_path else None
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._ffmpeg = ffmpeg
+        self._tools: Optional[Toolchain] = None
+        self._memo: 'OrderedDict[Tuple[str, int, int], MediaInfo]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._tools_lock = threading.Lock()
+
+    @property
+    def tools(self) -> Toolchain:
+        with self._tools_lock:
+            if self._tools is None:
+                self._tools = self._resolve_tools()
+            return self._tools
+
+    def _resolve_tools(self) -> Toolchain:
+        candidates = [self._ffmpeg] if self._ffmpeg else _candidates('ffmpeg')
+        for ffmpeg in candidates:
+            try:
+                key = _fingerprint(ffmpeg)
+            except OSError:
+                continue
+            cached = self.cache.get_tool(key) if self.cache else None
+            if cached:
+                return Toolchain(cached['ffmpeg'], cached['ffprobe'], cached['version'])
+            try:
+                result = subprocess.run([ffmpeg, '-version'], capture_output=True, text=True, timeout=5)
+                if result.returncode != 0:
+                    continue
+            except (subprocess.TimeoutExpired, OSError):
+                continue
+
+            # ffprobe 与 ffmpeg 位于同一目录，否则在 PATH 中查找
+            directory, name = os.path.split(ffmpeg)
+            sibling = os.path.join(directory, 'ffprobe' + os.path.splitext(name)[1])
+            ffprobe = sibling if os.path.isfile(sibling) else (shutil.which('ffprobe') or 'ffprobe')
+            version = result.stdout.splitlines()[0] if result.stdout else ''
+            tools = Toolchain(ffmpeg, ffprobe, version)
+            if self.cache:
+                self.cache.put_tool(key, {'ffmpeg': ffmpeg, 'ffprobe': ffprobe, 'version': version})
+            return tools
+
+        raise RuntimeError("FFmpeg not found. Please install FFmpeg and ensure it's in PATH.")
+
+    def _run_ffprobe(self, path: str, size: int) -> MediaInfo:
+        cmd = [self.tools.ffprobe, '-v', 'error', '-show_entries', PROBE_ENTRIES, '-of', 'json', path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except (subprocess.TimeoutExpired, OSError) as e:
+            raise ProbeError(f"ffprobe failed for {path}: {e}")
+        if result.returncode != 0:
+            raise ProbeError(f"ffprobe failed for {path}: {result.stderr.strip()}")
+        try:
+            return MediaInfo.from_ffprobe(path, size, json.loads(result.stdout))
+        except (ValueError, AttributeError) as e:
+            raise ProbeError(f"Unreadable ffprobe output for {path}: {e}")
+
+    def probe(self, path: str) -> MediaInfo:
+        """Probe one file; raises ProbeError (or OSError) on failure."""
+        info, error = self._probe_batch([str(path)])[str(path)]
+        if info is None:
+            raise error
+        return info
+
+    def probe_many(self, paths: Iterable[str]) -> Dict[str, Optional[MediaInfo]]:
+        """Probe many files concurrently; failed probes map to None."""
+        return {path: info for path, (info, _) in self._probe_batch([str(p) for p in paths]).items()}
+
+    def _remember(self, key: Tuple[str, int, int], info: MediaInfo):
+        """Keep a result in memory, dropping the least recently used ones (caller holds the lock)."""
+        self._memo[key] = info
+        self._memo.move_to_end(key)
+        while len(self._memo) > MEMO_ENTRIES:
+            self._memo.popitem(last=False)
+
+    def _probe_batch(self, paths: List[str]) -> Dict[str, Tuple[Optional[MediaInfo], Optional[Exception]]]:
+        results: Dict[str, Tuple[Optional[MediaInfo], Optional[Exception]]] = {}
+        keys = {}
+        for path in paths:
+            try:
+                keys[path] = _fingerprint(path)
+            except OSError as e:
+                results[path] = (None, e)
+
+        with self._lock:
+            missing = {path: key for path, key in keys.items() if key not in self._memo}
+            for path, key in keys.items():
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    results[path] = (self._memo[key], None)
+
+        if missing and self.cache:
+            stored = self.cache.get_many(list(set(missing.values())))
+            for path, key in list(missing.items()):
+                if key[0] in stored:
+                    info = MediaInfo.from_dict(stored[key[0]])
+                    with self._lock:
+                        self._remember(key, info)
+                    results[path] = (info, None)
+                    del missing[path]
+
+        if missing:
+            def run(path):
+                try:
+                    return path, self._run_ffprobe(path, missing[path][1]), None
+                except ProbeError as e:
+                    return path, None, e
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                probed = list(executor.map(run, missing))
+
+            new_entries = []
+            for path, info, error in probed:
+                results[path] = (info, error)
+                if info is not None:
+                    with self._lock:
+                        self._remember(missing[path], info)
+                    new_entries.append((missing[path], info.to_dict()))
+            if self.cache:
+                self.cache.put_many(new_entries)
+
+        return results
+
+_SHARED: Dict[Tuple[Any, ...], MetadataService] = {}
+_SHARED_LOCK = threading.Lock()
+
+def shared_service(cache_path: Optional[str] = None, workers: int = 8,
+                   ffmpeg: Optional[str] = None) -> MetadataService:
+    """Return the process-wide service for these settings, creating it once."""
+    cache_path = str(cache_path) if cache_path else None
+    key = (cache_path, workers, ffmpeg)
+    with _SHARED_LOCK:
+        if key not in _SHARED:
+            _SHARED[key] = MetadataService(cache_path, workers, ffmpeg)
+        return _SHARED[key]
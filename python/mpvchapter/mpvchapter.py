@@ -6,18 +6,48 @@ Extracts chapters from video files by detecting silence segments.
 Usage:
     python mpvchapter.py
     (Configure settings in config.json)
+    python mpvchapter.py video.mp4 lectures/ --jobs 4 --set detection.min_gap=10
+    python mpvchapter.py --json video.mp4
+    python mpvchapter.py --serve
+
+Library use:
+    from mpvchapter import extract_chapters
+    chapters = extract_chapters('video.mp4', detection={'min_gap': 10})
 """
 
+import argparse
+import bisect
+import copy
+import hashlib
 import json
 import os
+import queue
 import re
+import signal
 import subprocess
 import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 from dataclasses import dataclass
 import logging
 
+from chapter_writers import ChapterWriter, TextWriter, create_writers, format_timestamp, write_atomic
+from discovery import discover_inputs, pattern_matcher
+from job_journal import FAILED, QUEUED, RUNNING, JobJournal
+from job_runner import JobKilled, JobRunner, ResourceLimits
+from manifest import ChapterManifest
+from media_probe import MetadataService, default_cache_path, shared_service
+from pcm_detector import PcmSilenceDetector, build_decode_command
+from preview_sprites import SpriteBuilder, SpritePlan
+from silence_cache import SilenceCache
+from streaming import ProvisionalChapters
+from telemetry import ProgressParser, Telemetry, progress_args
+from watcher import FolderWatcher
+from worker import JsonLinesWorker
+
 @dataclass
 class SilenceSegment:
     """Represents a silence segment in the audio."""
@@ -32,13 +62,56 @@ class ChapterMark:
     title: str
     index: int
 
+@dataclass
+class SweepResult:
+    """Chapters produced by one combination of detection parameters."""
+    noise_threshold_db: float
+    min_silence: float
+    silences: List[SilenceSegment]
+    chapter_count: int
+    mean_chapter_length: float
+
+@dataclass
+class ProcessResult:
+    """Outcome of processing one video in a batch."""
+    path: Path
+    success: bool
+    error: Optional[str] = None
+
+class _VideoLogFilter(logging.Filter):
+    """Prefix log records with the video handled by the current worker thread."""
+
+    def __init__(self, context: threading.local):
+        super().__init__()
+        self.context = context
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        video = getattr(self.context, 'video', None)
+        if video:
+            record.msg = f"[{video}] {record.msg}"
+        return True
+
+# 每个线程当前处理的视频和时长，所有提取器共用；过滤器只挂到模块的 logger 上一次，
+# 库模式反复创建提取器时不会重复添加
+_LOG_CONTEXT = threading.local()
+logging.getLogger(__name__).addFilter(_VideoLogFilter(_LOG_CONTEXT))
+
 class VideoChapterExtractor:
     """Main class for extracting chapters from video files."""
 
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        self._log_context = _LOG_CONTEXT
+        self._stop_event = threading.Event()
+        self._concurrent = False
         self._setup_logging()
+        self.metadata = self._setup_metadata()
+        self.runner = self._setup_runner()
         self.ffmpeg_path = self._find_ffmpeg()
+        self.cache = self._setup_cache()
+        self.telemetry = self._setup_telemetry()
+        self.writers = self._setup_writers()
+        self.previews = self._setup_previews()
 
     def _setup_logging(self):
         """Setup logging based on configuration."""
@@ -49,92 +122,340 @@ class VideoChapterExtractor:
         logging.basicConfig(level=level, format=format_str)
         self.logger = logging.getLogger(__name__)
 
+    def _setup_cache(self) -> Optional[SilenceCache]:
+        """Open the silence cache if enabled in configuration."""
+        cache_config = self.config.get('cache', {})
+        if not cache_config.get('enabled', False):
+            return None
+
+        path = cache_config.get('path', '.mpvchapter_cache.db')
+        max_entries = cache_config.get('max_entries', 5000)
+        self.logger.info(f"Using silence cache: {path}")
+        return SilenceCache(path, max_entries)
+
+    def _setup_metadata(self) -> MetadataService:
+        """Get the shared FFprobe metadata service (binaries and probe results are cached)."""
+        probe_config = self.config.get('probe', {})
+        cache_path = None
+        if probe_config.get('cache', True):
+            cache_path = probe_config.get('cache_path') or default_cache_path()
+        return shared_service(cache_path, probe_config.get('workers', 8))
+
+    def _setup_runner(self) -> JobRunner:
+        """Create the runner that applies the resource limits to every FFmpeg job."""
+        limits = ResourceLimits.from_config(self.config.get('limits', {}))
+        return JobRunner(limits, self.logger)
+
+    def _setup_telemetry(self) -> Optional[Telemetry]:
+        """Create the FFmpeg telemetry collector if enabled in configuration."""
+        telemetry_config = self.config.get('telemetry', {})
+        if not telemetry_config.get('enabled', False):
+            return None
+
+        return Telemetry(
+            self.logger,
+            jsonl_path=telemetry_config.get('jsonl') or None,
+            prometheus_path=telemetry_config.get('prometheus') or None,
+            console_interval=telemetry_config.get('console_interval', 5),
+            stats_period=telemetry_config.get('stats_period', 1)
+        )
+
+    def _setup_writers(self) -> List[ChapterWriter]:
+        """Create the output writers listed in output.formats."""
+        output_config = self.config.get('output', {})
+        formats = output_config.get('formats') or ['chapter']
+        return create_writers(formats, output_config, self.ffmpeg_path, self._run_remux)
+
+    def _setup_previews(self) -> Optional[SpriteBuilder]:
+        """Create the preview sprite builder if enabled in configuration."""
+        preview_config = self.config.get('previews', {})
+        if not preview_config.get('enabled', False):
+            return None
+        return SpriteBuilder(preview_config, self.ffmpeg_path)
+
+    def detection_params(self) -> Dict[str, Any]:
+        """Parameters that affect the raw silence list (used as the cache key)."""
+        detection_config = self.config.get('detection', {})
+        params = {
+            'noise_threshold_db': detection_config.get('noise_threshold_db', -30),
+            'min_silence': detection_config.get('min_silence', 1.0),
+        }
+        # 快速分析会改变采样率和声道，结果可能与完整解码略有不同
+        if detection_config.get('fast_analysis', False):
+            params['audio_stream'] = detection_config.get('audio_stream', 0)
+            params['sample_rate'] = detection_config.get('analysis_sample_rate', 8000)
+        if detection_config.get('engine', 'ffmpeg') == 'pcm':
+            params['engine'] = 'pcm'
+            params['audio_stream'] = detection_config.get('audio_stream', 0)
+            params['sample_rate'] = detection_config.get('analysis_sample_rate', 8000)
+            params['pcm_window'] = detection_config.get('pcm_window', 0.01)
+            params['pcm_level'] = detection_config.get('pcm_level', 'rms')
+        if self.scenes_enabled():
+            scene_config = self.config.get('scenes', {})
+            params['scenes'] = {key: scene_config.get(key, default) for key, default in (
+                ('threshold', 0.3), ('fps', 2), ('width', 160),
+                ('keyframes_only', False), ('video_stream', 0))}
+        return params
+
+    def scenes_enabled(self) -> bool:
+        """Whether scene changes are detected alongside silences (FFmpeg engine only)."""
+        return (self.config.get('scenes', {}).get('enabled', False) and
+                self.config.get('detection', {}).get('engine', 'ffmpeg') == 'ffmpeg')
+
+    def _start_process(self, cmd: List[str], name: Optional[str] = None, **kwargs) -> subprocess.Popen:
+        """Start a child process under the configured resource limits."""
+        if self._stop_event.is_set():
+            raise RuntimeError("Processing has been stopped")
+        return self.runner.start(cmd, name, **kwargs)
+
+    def _finish_process(self, process: subprocess.Popen):
+        """Stop tracking a child process once it has exited."""
+        self.runner.finish(process)
+
+    def _start_ffmpeg(self, cmd: List[str], kind: str, follow: bool = False,
+                      **kwargs) -> Tuple[subprocess.Popen, Optional[ProgressParser]]:
+        """Start FFmpeg, adding progress reporting when telemetry is enabled.
+
+        Progress is written to stderr. With follow=True stderr is read in a
+        background thread (for commands whose stderr is otherwise unused);
+        otherwise the caller passes each stderr line to telemetry.feed.
+        """
+        job = Path(cmd[cmd.index('-i') + 1]).name
+        if not self.telemetry:
+            return self._start_process(cmd, f"{kind} {job}", **kwargs), None
+
+        cmd = [cmd[0], *progress_args(self.telemetry.stats_period), *cmd[1:]]
+        if follow:
+            kwargs['stderr'] = subprocess.PIPE
+        process = self._start_process(cmd, f"{kind} {job}", **kwargs)
+
+        # 预计处理的媒体时长：分段窗口取 -t，否则为视频时长减去 -ss
+        media_duration = getattr(self._log_context, 'duration', None)
+        if '-t' in cmd:
+            media_duration = float(cmd[cmd.index('-t') + 1])
+        elif '-ss' in cmd and media_duration:
+            media_duration -= float(cmd[cmd.index('-ss') + 1])
+        parser = self.telemetry.start(job, kind, process.pid, media_duration)
+        if follow:
+            self.telemetry.follow(parser, process.stderr)
+        return process, parser
+
+    def _finish_ffmpeg(self, process: subprocess.Popen, parser: Optional[ProgressParser]):
+        """Stop tracking an FFmpeg process and record its telemetry."""
+        # 出错退出时 FFmpeg 可能仍在运行，先结束它的进程组，否则读取线程无法结束
+        self._finish_process(process)
+        if parser:
+            self.telemetry.finish(parser, process.returncode == 0)
+
+    def _run_remux(self, cmd: List[str]) -> int:
+        """Run an FFmpeg remux for the embed writer and return its exit code."""
+        process, parser = self._start_ffmpeg(cmd, 'embed', follow=True)
+        try:
+            process.wait()
+        finally:
+            self._finish_ffmpeg(process, parser)
+        self.runner.check(process)
+        return process.returncode
+
+    def _run_job(self, cmd: List[str], kind: str):
+        """Run an FFmpeg command whose output goes to files; raise on failure."""
+        process, parser = self._start_ffmpeg(cmd, kind, follow=True,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            process.wait()
+        finally:
+            self._finish_ffmpeg(process, parser)
+        self.runner.check(process)
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {process.returncode}")
+
+    def stop(self):
+        """Stop all running FFmpeg processes and refuse to start new ones."""
+        self._stop_event.set()
+        self.runner.stop()
+
     def _find_ffmpeg(self) -> str:
         """Find FFmpeg executable."""
-        # Try common FFmpeg paths
-        ffmpeg_paths = ['ffmpeg', 'ffmpeg.exe']
-
-        # Add common installation paths on Windows
-        if os.name == 'nt':
-            program_files = os.environ.get('PROGRAMFILES', 'C:\\Program Files')
-            ffmpeg_paths.extend([
-                os.path.join(program_files, 'ffmpeg', 'bin', 'ffmpeg.exe'),
-                os.path.join(program_files, 'ffmpeg', 'bin', 'ffmpeg'),
-            ])
-
-        for path in ffmpeg_paths:
-            try:
-                result = subprocess.run([path, '-version'],
-                                     capture_output=True, text=True, timeout=5)
-                if result.returncode == 0:
-                    self.logger.info(f"Found FFmpeg at: {path}")
-                    return path
-            except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                continue
-
-        raise RuntimeError("FFmpeg not found. Please install FFmpeg and ensure it's in PATH.")
+        tools = self.metadata.tools
+        self.logger.info(f"Found FFmpeg at: {tools.ffmpeg}")
+        return tools.ffmpeg
 
     def get_video_duration(self, video_path: str) -> Optional[float]:
-        """Get video duration using FFprobe."""
+        """Get video duration from the shared metadata service."""
         try:
-            cmd = [
-                self.ffmpeg_path.replace('ffmpeg', 'ffprobe'),
-                '-v', 'quiet',
-                '-show_entries', 'format=duration',
-                '-of', 'json',
-                video_path
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                duration = float(data['format']['duration'])
-                self.logger.info(f"Video duration: {duration:.2f} seconds")
-                return duration
-            else:
-                self.logger.error(f"Failed to get duration: {result.stderr}")
+            info = self.metadata.probe(video_path)
+            if not info.duration:
+                self.logger.error(f"Failed to get duration: no duration reported for {video_path}")
                 return None
+            duration = info.duration
+            self.logger.info(f"Video duration: {duration:.2f} seconds")
+            # 供遥测计算当前视频的处理进度和 ETA
+            self._log_context.duration = duration
+            return duration
         except Exception as e:
             self.logger.error(f"Error getting video duration: {e}")
             return None
 
-    def detect_silences(self, video_path: str) -> List[SilenceSegment]:
-        """Detect silence segments using FFmpeg's silencedetect filter."""
-        silences = []
+    def scene_filter(self) -> str:
+        """Filter chain that logs the time of every scene change of a downscaled, low-fps video."""
+        scene_config = self.config.get('scenes', {})
+        threshold = scene_config.get('threshold', 0.3)
+        chain = [f"scale={scene_config.get('width', 160)}:-2", f"select='gt(scene,{threshold})'",
+                 'metadata=print']
+        if not scene_config.get('keyframes_only', False):
+            chain.insert(0, f"fps={scene_config.get('fps', 2)}")
+        return ','.join(chain)
+
+    def scene_output_args(self) -> List[str]:
+        """Extra FFmpeg output that runs the scene filter on the video stream."""
+        video_stream = self.config.get('scenes', {}).get('video_stream', 0)
+        return ['-map', f'0:v:{video_stream}', '-vf', self.scene_filter(), '-f', 'null', '-']
+
+    def _has_scene_stream(self, video_path: str) -> bool:
+        """Whether the video has the stream that scene detection reads."""
+        video_stream = self.config.get('scenes', {}).get('video_stream', 0)
+        try:
+            info = self.metadata.probe(video_path)
+        except Exception as e:
+            self.logger.warning(f"Cannot probe video streams: {e}")
+            return False
+        # 与 FFmpeg 的 v:N 一致，封面图也算作视频流
+        return len([s for s in info.streams if s.codec_type == 'video']) > video_stream
 
-        # Get detection parameters from config
+    def _check_audio_stream(self, video_path: str):
+        """Raise RuntimeError if the video lacks the audio stream selected by detection.audio_stream."""
+        audio_stream = self.config.get('detection', {}).get('audio_stream', 0)
+        try:
+            info = self.metadata.probe(video_path)
+        except Exception as e:
+            # 无法探测时交给 FFmpeg 报错
+            self.logger.warning(f"Cannot probe audio streams: {e}")
+            return
+        if audio_stream >= len(info.audio):
+            raise RuntimeError(f"Audio stream {audio_stream} not found ({len(info.audio)} audio streams)")
+
+    def scene_input_args(self) -> List[str]:
+        """Input options for the video decoder of the scene pass."""
+        # 只解码关键帧：编码器通常在场景切换处插入关键帧，解码量降到很小
+        if self.config.get('scenes', {}).get('keyframes_only', False):
+            return ['-skip_frame:v', 'nokey']
+        return []
+
+    def build_silencedetect_command(self, video_path: str, start: Optional[float] = None,
+                                    length: Optional[float] = None, scenes: bool = False,
+                                    sprite: Optional[SpritePlan] = None) -> List[str]:
+        """Build the FFmpeg command that runs silencedetect on a video (or a window of it).
+
+        With scenes=True the same command also runs the scene filter on the
+        video stream as a second output, and with a sprite plan it writes the
+        preview tiles as a further output, so the file is demuxed only once.
+        """
         detection_config = self.config.get('detection', {})
         noise_threshold = detection_config.get('noise_threshold_db', -30)
         min_silence = detection_config.get('min_silence', 1.0)
+        silencedetect = f'silencedetect=noise={noise_threshold}dB:d={min_silence}'
+
+        # Input seeking limits decoding to the requested window
+        window = []
+        if start:
+            window.extend(['-ss', f'{start:.3f}'])
+        if length is not None:
+            window.extend(['-t', f'{length:.3f}'])
+
+        # 场景检测和预览图作为额外的输出，共用同一次解复用
+        extra = self.scene_output_args() if scenes else []
+        if sprite:
+            extra += self.previews.output_args(sprite)
+
+        # 预览图输出到文件，覆盖上次中断时留下的临时文件
+        overwrite = ['-y'] if sprite else []
+        # -skip_frame 作用于输入的解码器，所有输出都只会得到关键帧；预览图需要按时间间隔取帧，
+        # 这时解码全部帧（反正要完整解码一次，合并在一次运行中仍比单独生成预览图快）
+        scene_input = self.scene_input_args() if scenes and not sprite else []
+
+        if not detection_config.get('fast_analysis', False):
+            if extra:
+                return [
+                    self.ffmpeg_path,
+                    *overwrite,
+                    *window,
+                    *scene_input,
+                    '-i', video_path,
+                    '-vn', '-af', silencedetect,
+                    '-f', 'null',
+                    '-',
+                    *extra
+                ]
+            return [
+                self.ffmpeg_path,
+                *window,
+                '-i', video_path,
+                '-af', silencedetect,
+                '-f', 'null',
+                '-'
+            ]
 
-        cmd = [
-            self.ffmpeg_path,
+        # Fast analysis: decode only the selected audio track, downmix to mono
+        # and resample to a low rate before running silencedetect
+        audio_stream = detection_config.get('audio_stream', 0)
+        sample_rate = detection_config.get('analysis_sample_rate', 8000)
+        decoder_threads = detection_config.get('decoder_threads', 0)
+
+        cmd = [self.ffmpeg_path, '-hide_banner', '-nostats', *overwrite]
+        if decoder_threads:
+            cmd.extend(['-threads', str(decoder_threads)])
+        # 检测场景切换或生成预览图时需要保留视频流，由额外的输出处理
+        cmd.extend(['-sn', '-dn'] if extra else ['-vn', '-sn', '-dn'])
+        cmd.extend(scene_input)
+        cmd.extend([
+            *window,
             '-i', video_path,
-            '-af', f'silencedetect=noise={noise_threshold}dB:d={min_silence}',
+            '-map', f'0:a:{audio_stream}',
+            '-af', f'aresample={sample_rate},aformat=channel_layouts=mono,{silencedetect}',
             '-f', 'null',
             '-'
-        ]
-
-        self.logger.info(f"Detecting silences with threshold: {noise_threshold}dB, min duration: {min_silence}s")
+        ])
+        cmd.extend(extra)
+        return cmd
+
+    def _iter_silencedetect(self, cmd: List[str],
+                            scenes: Optional[List[float]] = None) -> Iterator[SilenceSegment]:
+        """Run a silencedetect command, yielding each segment as FFmpeg reports it.
+
+        The generator's return value is the start of a silence still open when
+        the input ended (if any). Scene changes printed by the scene filter are
+        appended to scenes when it is given.
+        """
+        open_start = None
+
+        # Run FFmpeg and capture stderr (where silencedetect outputs its data)
+        process, progress = self._start_ffmpeg(
+            cmd, 'silencedetect',
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            universal_newlines=True
+        )
 
         try:
-            # Run FFmpeg and capture stderr (where silencedetect outputs its data)
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-
             # Parse silence detection output
             for line in process.stderr:
+                if progress and self.telemetry.feed(progress, line):
+                    continue
                 line = line.strip()
 
+                # Parse scene changes: "[Parsed_metadata_3 @ 0x...] frame:5 pts:10 pts_time:5"
+                if scenes is not None and 'Parsed_metadata' in line:
+                    scene_match = re.search(r'pts_time:\s*(-?[0-9]+(?:\.[0-9]+)?)', line)
+                    if scene_match:
+                        scenes.append(float(scene_match.group(1)))
+                    continue
+
                 # Parse silence_start
-                start_match = re.search(r'silence_start:\s*([0-9]+(?:\.[0-9]+)?)', line)
+                start_match = re.search(r'silence_start:\s*(-?[0-9]+(?:\.[0-9]+)?)', line)
                 if start_match:
+                    open_start = max(0.0, float(start_match.group(1)))
                     continue
 
                 # Parse silence_end and duration
@@ -149,21 +470,340 @@ class VideoChapterExtractor:
                     # Calculate start time from end and duration
                     start_time = end_time - duration
 
-                    silence = SilenceSegment(
+                    open_start = None
+                    yield SilenceSegment(
                         start=start_time,
                         end=end_time,
                         duration=duration
                     )
-                    silences.append(silence)
 
             process.wait()
+        finally:
+            # 调用方提前停止迭代时不再需要剩余输出
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+            self._finish_ffmpeg(process, progress)
+
+        # 超时或无进展被终止时输出不完整，不能当作正常结果
+        self.runner.check(process)
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {process.returncode}")
+        return open_start
+
+    def _run_silencedetect(self, cmd: List[str], scenes: Optional[List[float]] = None
+                           ) -> Tuple[List[SilenceSegment], Optional[float]]:
+        """Run a silencedetect command, returning closed segments and the start of
+        a silence still open when the input ended (if any)."""
+        silences = []
+        segments = self._iter_silencedetect(cmd, scenes)
+        while True:
+            try:
+                silences.append(next(segments))
+            except StopIteration as stop:
+                return silences, stop.value
 
-            self.logger.info(f"Detected {len(silences)} silence segments")
-            return silences
+    def plan_windows(self, duration: float) -> List[Tuple[float, Optional[float]]]:
+        """Split the timeline into overlapping (start, length) windows.
 
-        except Exception as e:
-            self.logger.error(f"Error detecting silences: {e}")
-            return []
+        The last window has no length so it always reads to the end of the file.
+        """
+        detection_config = self.config.get('detection', {})
+        count = max(1, int(detection_config.get('segments', 1)))
+        min_silence = detection_config.get('min_silence', 1.0)
+        # 重叠部分至少要能完整容纳一个最短静音段，否则跨边界的短静音会被漏掉
+        overlap = max(detection_config.get('segment_overlap', 5.0), 2 * min_silence)
+
+        step = duration / count
+        if count == 1 or step <= overlap:
+            return [(0.0, None)]
+
+        windows = []
+        for i in range(count):
+            start = i * step
+            length = None if i == count - 1 else step + overlap
+            windows.append((start, length))
+        return windows
+
+    @staticmethod
+    def merge_silences(silences: List[SilenceSegment], tolerance: float = 0.05) -> List[SilenceSegment]:
+        """Merge overlapping segments, stitching silences split across windows."""
+        merged = []
+        for seg in sorted(silences, key=lambda s: s.start):
+            if merged and seg.start <= merged[-1].end + tolerance:
+                last = merged[-1]
+                if seg.end > last.end:
+                    last.end = seg.end
+                    last.duration = last.end - last.start
+            else:
+                merged.append(SilenceSegment(seg.start, seg.end, seg.duration))
+        return merged
+
+    def _detect_window(self, video_path: str, start: float, length: Optional[float],
+                       scenes: Optional[List[float]] = None) -> List[SilenceSegment]:
+        """Detect silences (and scene changes) in one window, returning absolute timestamps."""
+        cmd = self.build_silencedetect_command(video_path, start, length, scenes is not None)
+        window_scenes = [] if scenes is not None else None
+        silences, open_start = self._run_silencedetect(cmd, window_scenes)
+        if window_scenes:
+            scenes.extend(start + t for t in window_scenes)
+
+        result = [SilenceSegment(start + seg.start, start + seg.end, seg.duration) for seg in silences]
+        # 窗口末尾未结束的静音延伸到窗口边界，由相邻窗口补全
+        if open_start is not None and length is not None:
+            result.append(SilenceSegment(start + open_start, start + length, length - open_start))
+        return result
+
+    def detect_silences_pcm(self, video_path: str,
+                            thresholds: List[float]) -> Dict[float, List[SilenceSegment]]:
+        """Detect silences for several noise thresholds from a single PCM decode."""
+        self._check_audio_stream(video_path)
+        detection_config = self.config.get('detection', {})
+        sample_rate = detection_config.get('analysis_sample_rate', 8000)
+        detector = PcmSilenceDetector(
+            thresholds,
+            detection_config.get('min_silence', 1.0),
+            sample_rate=sample_rate,
+            window=detection_config.get('pcm_window', 0.01),
+            mode=detection_config.get('pcm_level', 'rms')
+        )
+        cmd = build_decode_command(
+            self.ffmpeg_path, video_path,
+            audio_stream=detection_config.get('audio_stream', 0),
+            sample_rate=sample_rate,
+            decoder_threads=detection_config.get('decoder_threads', 0)
+        )
+
+        process, progress = self._start_ffmpeg(cmd, 'pcm', follow=True,
+                                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            results = detector.run(process.stdout)
+            process.wait()
+        finally:
+            self._finish_ffmpeg(process, progress)
+
+        self.runner.check(process)
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {process.returncode}")
+
+        return {
+            threshold: [SilenceSegment(*seg) for seg in segments]
+            for threshold, segments in results.items()
+        }
+
+    def _with_detection(self, quiet: bool = False, **overrides) -> 'VideoChapterExtractor':
+        """Return a copy of this extractor using different detection parameters."""
+        clone = copy.copy(self)
+        clone.config = copy.deepcopy(self.config)
+        clone.config.setdefault('detection', {}).update(overrides)
+        if quiet:
+            clone.logger = logging.getLogger(f"{__name__}.sweep")
+            clone.logger.setLevel(logging.WARNING)
+        return clone
+
+    def sweep_parameters(self, video_path: str, duration: float) -> List[SweepResult]:
+        """Evaluate every threshold/min_silence combination from a single decode."""
+        detection_config = self.config.get('detection', {})
+        sweep_config = self.config.get('sweep', {})
+
+        # 始终包含当前配置的参数，未选出最佳组合时直接使用
+        thresholds = sorted(set(sweep_config.get('thresholds', [-25, -30, -35, -40]) +
+                                [detection_config.get('noise_threshold_db', -30)]))
+        min_silences = sorted(set(sweep_config.get('min_silences', [0.5, 1.0, 1.5]) +
+                                  [detection_config.get('min_silence', 1.0)]))
+
+        self.logger.info(f"Sweeping {len(thresholds)} thresholds x {len(min_silences)} min_silence values")
+        detector = self._with_detection(min_silence=min_silences[0])
+        by_threshold = detector.detect_silences_pcm(video_path, thresholds)
+
+        results = []
+        for threshold in thresholds:
+            for min_silence in min_silences:
+                silences = [seg for seg in by_threshold[threshold] if seg.duration >= min_silence]
+                evaluator = self._with_detection(quiet=True, noise_threshold_db=threshold,
+                                                 min_silence=min_silence)
+                chapters = evaluator.generate_chapter_marks(silences, duration)
+                results.append(SweepResult(threshold, min_silence, silences,
+                                           len(chapters), duration / len(chapters)))
+        return results
+
+    def pick_sweep_result(self, results: List[SweepResult]) -> Optional[SweepResult]:
+        """Pick the combination whose mean chapter length is closest to the target."""
+        target = self.config.get('sweep', {}).get('target_chapter_length')
+        if not target or not results:
+            return None
+        return min(results, key=lambda r: abs(r.mean_chapter_length - target))
+
+    def detect_silences(self, video_path: str, duration: Optional[float] = None,
+                        scenes: Optional[List[float]] = None,
+                        sprite: Optional[SpritePlan] = None) -> List[SilenceSegment]:
+        """Detect silence segments using FFmpeg's silencedetect filter.
+
+        When detection.segments > 1 and the duration is known, the timeline is split
+        into overlapping windows that are analysed in parallel and merged. With
+        detection.engine = "pcm" the levels are computed in-process instead.
+
+        When scenes is given and scene detection is enabled, the scene changes
+        found in the same FFmpeg pass are stored in it, sorted. When a sprite
+        plan is given, the same pass also writes the preview tiles if it runs
+        as a single FFmpeg command (sprite.tiles_done is then set).
+
+        Raises RuntimeError if FFmpeg fails, so a failed pass is never taken
+        for a video without silences.
+        """
+        if not self.scenes_enabled():
+            scenes = None
+        elif scenes is not None and not self._has_scene_stream(video_path):
+            # 纯音频文件没有视频流，-map 0:v:N 会让整个 FFmpeg 命令失败
+            self.logger.info("No video stream for scene detection")
+            scenes = None
+        # Get detection parameters from config
+        detection_config = self.config.get('detection', {})
+        noise_threshold = detection_config.get('noise_threshold_db', -30)
+        min_silence = detection_config.get('min_silence', 1.0)
+
+        self.logger.info(f"Detecting silences with threshold: {noise_threshold}dB, min duration: {min_silence}s")
+
+        windows = self.plan_windows(duration) if duration else [(0.0, None)]
+        if detection_config.get('fast_analysis', False) and detection_config.get('engine', 'ffmpeg') != 'pcm':
+            # 快速分析用 -map 0:a:N 选择音轨，音轨不存在时 FFmpeg 只会报错退出
+            self._check_audio_stream(video_path)
+
+        if detection_config.get('engine', 'ffmpeg') == 'pcm':
+            silences = self.detect_silences_pcm(video_path, [noise_threshold])[noise_threshold]
+        elif len(windows) == 1:
+            cmd = self.build_silencedetect_command(video_path, scenes=scenes is not None, sprite=sprite)
+            silences, _ = self._run_silencedetect(cmd, scenes)
+            if sprite:
+                sprite.tiles_done = True
+        else:
+            self.logger.info(f"Analysing {len(windows)} windows in parallel")
+            with ThreadPoolExecutor(max_workers=len(windows)) as executor:
+                try:
+                    parts = executor.map(lambda w: self._detect_window(video_path, *w, scenes), windows)
+                    silences = self.merge_silences([seg for part in parts for seg in part])
+                except KeyboardInterrupt:
+                    # FFmpeg 收不到 Ctrl+C，先结束进程再离开线程池，否则会等到所有窗口分析完
+                    self.stop()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+        self.logger.info(f"Detected {len(silences)} silence segments")
+        if scenes is not None:
+            # 相邻窗口重叠部分的同一场景切换只保留一个
+            merged = []
+            for t in sorted(scenes):
+                if not merged or t - merged[-1] > 0.5:
+                    merged.append(t)
+            scenes[:] = merged
+            self.logger.info(f"Detected {len(scenes)} scene changes")
+        return silences
+
+    def _follow_growing(self, cmd: List[str]) -> List[str]:
+        """With streaming.growing, keep reading at the end of a file that is still being written.
+
+        FFmpeg's file protocol retries at end of file (-follow 1); the read
+        gives up, and FFmpeg finishes normally, once no new data has arrived
+        for streaming.idle_seconds.
+        """
+        streaming_config = self.config.get('streaming', {})
+        if not streaming_config.get('growing', False):
+            return cmd
+        idle = float(streaming_config.get('idle_seconds', 30))
+        i = cmd.index('-i')
+        # 只有 file: 协议支持 follow，绝对路径避免文件名中的冒号被当作协议名
+        return cmd[:i] + ['-follow', '1', '-rw_timeout', str(int(idle * 1e6)),
+                          '-i', 'file:' + os.path.abspath(cmd[i + 1])] + cmd[i + 2:]
+
+    def iter_silences(self, video_path: str) -> Iterator[SilenceSegment]:
+        """Yield silence segments in time order while FFmpeg is still decoding.
+
+        Always reads the file sequentially (detection.segments is ignored). With
+        streaming.growing the file is followed while it is being written.
+        """
+        detection_config = self.config.get('detection', {})
+        pcm = detection_config.get('engine', 'ffmpeg') == 'pcm'
+        # 正在录制的文件可能还探测不到音轨，这时由 FFmpeg 的退出码报告错误
+        if ((pcm or detection_config.get('fast_analysis', False)) and
+                not self.config.get('streaming', {}).get('growing', False)):
+            self._check_audio_stream(video_path)
+        if not pcm:
+            cmd = self.build_silencedetect_command(video_path)
+            yield from self._iter_silencedetect(self._follow_growing(cmd))
+            return
+
+        sample_rate = detection_config.get('analysis_sample_rate', 8000)
+        detector = PcmSilenceDetector(
+            [detection_config.get('noise_threshold_db', -30)],
+            detection_config.get('min_silence', 1.0),
+            sample_rate=sample_rate,
+            window=detection_config.get('pcm_window', 0.01),
+            mode=detection_config.get('pcm_level', 'rms')
+        )
+        cmd = build_decode_command(
+            self.ffmpeg_path, video_path,
+            audio_stream=detection_config.get('audio_stream', 0),
+            sample_rate=sample_rate,
+            decoder_threads=detection_config.get('decoder_threads', 0)
+        )
+
+        process, progress = self._start_ffmpeg(self._follow_growing(cmd), 'pcm', follow=True,
+                                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            for _, segment in detector.stream(process.stdout):
+                yield SilenceSegment(*segment)
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+            self._finish_ffmpeg(process, progress)
+
+        self.runner.check(process)
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {process.returncode}")
+
+    def stream_chapter_marks(self, video_path: str,
+                             duration: Optional[float] = None) -> Iterator[ChapterMark]:
+        """Yield chapter marks as soon as they are final, without keeping the silence list.
+
+        The adaptive threshold is estimated online, so the result can differ
+        slightly from generate_chapter_marks on the full silence list. Without
+        a duration the skip_tail bound is not applied (e.g. for a recording
+        that is still growing).
+        """
+        detection_config = self.config.get('detection', {})
+        adaptive_config = self.config.get('adaptive', {})
+        chapters_config = self.config.get('chapters', {})
+        streaming_config = self.config.get('streaming', {})
+
+        builder = ProvisionalChapters(
+            detection_config.get('min_silence', 1.0),
+            adaptive_ratio=(adaptive_config.get('adaptive_ratio', 0.7)
+                            if adaptive_config.get('enabled', True) else None),
+            safety_ratio=detection_config.get('safety_ratio', 0.10),
+            min_gap=detection_config.get('min_gap', 5.0),
+            skip_head=detection_config.get('skip_head', 2.0),
+            skip_tail=detection_config.get('skip_tail', 2.0),
+            duration=duration,
+            warmup=streaming_config.get('warmup_silences', 8)
+        )
+        prefix = chapters_config.get('prefix', 'Chapter')
+        index = chapters_config.get('start_index', 1)
+
+        # Always start with 0
+        yield ChapterMark(0.0, f"{prefix} {index}", index)
+
+        for seg in self.iter_silences(video_path):
+            for time in builder.add(seg.end, seg.duration):
+                index += 1
+                yield ChapterMark(time, f"{prefix} {index}", index)
+        for time in builder.finish():
+            index += 1
+            yield ChapterMark(time, f"{prefix} {index}", index)
+
+        self.logger.info(f"Streamed {builder.count} silence segments, "
+                         f"final adaptive threshold: {builder.current_threshold():.2f}s")
 
     def calculate_adaptive_threshold(self, silences: List[SilenceSegment]) -> float:
         """Calculate adaptive threshold using quartile method to handle outliers."""
@@ -226,8 +866,44 @@ class VideoChapterExtractor:
         self.logger.info(f"Adaptive threshold: {adaptive_threshold:.2f}s (reference: {reference_duration:.2f}s, ratio: {adaptive_ratio})")
         return adaptive_threshold
 
-    def generate_chapter_marks(self, silences: List[SilenceSegment], duration: float) -> List[ChapterMark]:
-        """Generate chapter marks from silence segments."""
+    def snap_to_scenes(self, marks: List[float], scenes: List[float], duration: float) -> List[float]:
+        """Move each chapter mark to the nearest scene change within scenes.window seconds.
+
+        The first mark (0.0) stays put. A mark keeps its silence-derived time
+        when snapping would break min_gap or the skip_tail bound, and is dropped
+        if even that is too close to the previous mark.
+        """
+        scene_config = self.config.get('scenes', {})
+        detection_config = self.config.get('detection', {})
+        window = scene_config.get('window', 3.0)
+        min_gap = detection_config.get('min_gap', 5.0)
+        skip_tail = detection_config.get('skip_tail', 2.0)
+
+        refined = marks[:1]
+        snapped = 0
+        for mark in marks[1:]:
+            i = bisect.bisect_left(scenes, mark)
+            nearby = [scenes[j] for j in (i - 1, i) if 0 <= j < len(scenes)]
+            nearest = min(nearby, key=lambda t: abs(t - mark), default=None)
+
+            choices = [mark]
+            if nearest is not None and abs(nearest - mark) <= window and nearest <= duration - skip_tail:
+                choices.insert(0, nearest)
+            for choice in choices:
+                if choice - refined[-1] >= min_gap:
+                    refined.append(choice)
+                    snapped += choice != mark
+                    break
+
+        self.logger.info(f"Snapped {snapped} of {len(marks) - 1} chapters to scene changes")
+        return refined
+
+    def generate_chapter_marks(self, silences: List[SilenceSegment], duration: float,
+                               scenes: Optional[List[float]] = None) -> List[ChapterMark]:
+        """Generate chapter marks from silence segments.
+
+        When scene change times are given, the marks are refined with snap_to_scenes.
+        """
         if not silences:
             self.logger.warning("No silence segments detected")
             chapters_config = self.config.get('chapters', {})
@@ -279,6 +955,9 @@ class VideoChapterExtractor:
             if candidate - marks[-1] >= min_gap:
                 marks.append(candidate)
 
+        if scenes:
+            marks = self.snap_to_scenes(marks, scenes, duration)
+
         # Convert to ChapterMark objects
         prefix = chapters_config.get('prefix', 'Chapter')
         start_index = chapters_config.get('start_index', 1)
@@ -292,32 +971,16 @@ class VideoChapterExtractor:
         return chapters
 
     def format_time(self, seconds: float) -> str:
-        """Format time as MM:SS.mmm."""
-        if seconds < 0:
-            seconds = 0
-
-        total_ms = int(seconds * 1000 + 0.5)
-        mm = total_ms // 60000
-        ss = (total_ms % 60000) // 1000
-        ms = total_ms % 1000
-
-        return f"{mm:02d}:{ss:02d}.{ms:03d}"
+        """Format time as MM:SS.mmm, or H:MM:SS.mmm for videos longer than an hour."""
+        return format_timestamp(seconds)
 
     def write_chapter_file(self, chapters: List[ChapterMark], output_path: str) -> bool:
-        """Write chapter marks to file."""
+        """Write chapter marks to a file in the .chapter text format."""
         try:
             output_config = self.config.get('output', {})
-            encoding = output_config.get('encoding', 'utf-8')
-
-            lines = []
-            for chapter in chapters:
-                time_str = self.format_time(chapter.time)
-                lines.append(f"{time_str} {chapter.title}")
-
-            content = '\n'.join(lines)
-
-            with open(output_path, 'w', encoding=encoding) as f:
-                f.write(content)
+            writer = TextWriter(output_config)
+            # 先写临时文件再替换，正在读取章节文件的 mpv 不会看到写了一半的内容
+            write_atomic(Path(output_path), writer.render(chapters, None), writer.encoding)
 
             self.logger.info(f"Chapter file written: {output_path}")
             return True
@@ -326,6 +989,32 @@ class VideoChapterExtractor:
             self.logger.error(f"Error writing chapter file: {e}")
             return False
 
+    def get_output_path(self, video_path: Path) -> Path:
+        """Get the chapter file path for a video."""
+        paths = self.get_output_paths(video_path)
+        # 只嵌入到视频时，视频本身就是输出
+        return paths[0] if paths else video_path
+
+    def get_output_paths(self, video_path: Path) -> List[Path]:
+        """Get the paths of all files written for a video by the configured writers."""
+        paths = [writer.output_path(video_path) for writer in self.writers]
+        return [path for path in paths if path is not None]
+
+    def outputs_exist(self, video_path: Path) -> bool:
+        """Check whether every configured output file (and an up-to-date preview sprite) of a video exists."""
+        if self.previews and not self.previews.is_current(video_path):
+            return False
+        return all(path.exists() for path in self.get_output_paths(video_path))
+
+    def config_hash(self) -> str:
+        """Hash of the configuration sections that affect the chapter output."""
+        relevant = {
+            key: self.config.get(key, {})
+            for key in ('detection', 'adaptive', 'sweep', 'scenes', 'chapters', 'output')
+        }
+        data = json.dumps(relevant, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
     def process_video(self, video_path: str) -> bool:
         """Process a single video file."""
         video_path = Path(video_path)
@@ -336,27 +1025,222 @@ class VideoChapterExtractor:
 
         self.logger.info(f"Processing video: {video_path.name}")
 
-        # Get video duration
-        duration = self.get_video_duration(str(video_path))
-        if duration is None:
+        if self.config.get('sweep', {}).get('enabled', False):
+            sprite = self._plan_previews(video_path)
+            result = self._sweep_chapters(video_path)
+        else:
+            cached = self._cached_silences(video_path)
+            sprite = self._plan_previews(video_path)
+            if not cached and self.config.get('streaming', {}).get('enabled', False):
+                # 流式处理边解码边写章节，预览图在章节确定后单独生成
+                result = self._stream_chapters(video_path)
+            else:
+                result = self._detect_chapters(video_path, cached, sprite)
+
+        if result is None or not self._write_chapters(video_path, *result):
+            if sprite:
+                self.previews.cleanup([sprite.interval_path])
             return False
+        if sprite:
+            self._build_previews(sprite, result[0])
+        return True
+
+    def compute_chapters(self, video_path: str) -> Optional[Tuple[List[ChapterMark], float]]:
+        """Detect the chapters of a video without writing any output.
+
+        Returns the chapters and the video duration, or None on failure.
+        Streaming mode is not used; sweep mode returns the chapters of the
+        selected parameter combination.
+        """
+        video_path = Path(video_path)
+        if not video_path.exists():
+            self.logger.error(f"Video file not found: {video_path}")
+            return None
+
+        if self.config.get('sweep', {}).get('enabled', False):
+            return self._sweep_chapters(video_path)
+        return self._detect_chapters(video_path, self._cached_silences(video_path))
+
+    def _cached_silences(self, video_path: Path) -> Optional[Tuple[float, list, Optional[list]]]:
+        """Look up the cached silences of a video for the current detection parameters."""
+        if not self.cache:
+            return None
+        try:
+            return self.cache.get(str(video_path), self.detection_params())
+        except Exception as e:
+            self.logger.warning(f"Silence cache lookup failed: {e}")
+            return None
+
+    def _detect_chapters(self, video_path: Path, cached: Optional[Tuple[float, list, Optional[list]]],
+                         sprite: Optional[SpritePlan] = None) -> Optional[Tuple[List[ChapterMark], float]]:
+        """Generate chapter marks from cached silences, or detect them with FFmpeg.
+
+        Preview tiles of a sprite plan are written in the same pass when possible.
+        """
+        scenes = [] if self.scenes_enabled() else None
+        if cached:
+            duration = cached[0]
+            silences = [SilenceSegment(*seg) for seg in cached[1]]
+            if scenes is not None:
+                scenes = cached[2] or []
+            self.logger.info(f"Cache hit: {len(silences)} silence segments, duration {duration:.2f} seconds")
+        else:
+            # Get video duration
+            duration = self.get_video_duration(str(video_path))
+            if duration is None:
+                return None
+
+            # Detect silences
+            try:
+                silences = self.detect_silences(str(video_path), duration, scenes, sprite)
+            except JobKilled:
+                raise
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self.logger.error(f"Error detecting silences: {e}")
+                return None
+            if self._stop_event.is_set():
+                # FFmpeg was terminated, so the silence list is incomplete
+                return None
+
+            # FFmpeg 出错时已经返回，空结果表示确实没有静音，同样可以缓存
+            if self.cache:
+                try:
+                    self.cache.put(str(video_path), self.detection_params(), duration,
+                                   [(seg.start, seg.end, seg.duration) for seg in silences], scenes)
+                except Exception as e:
+                    self.logger.warning(f"Failed to update silence cache: {e}")
 
-        # Detect silences
-        silences = self.detect_silences(str(video_path))
         if not silences:
             self.logger.warning("No silences detected")
 
         # Generate chapter marks
-        chapters = self.generate_chapter_marks(silences, duration)
+        return self.generate_chapter_marks(silences, duration, scenes), duration
 
-        # Determine output path
-        output_config = self.config.get('output', {})
-        suffix = output_config.get('suffix', '.chapter')
-        # Append suffix to original filename: filename.ext.chapter
-        output_path = video_path.parent / (video_path.name + suffix)
+    def _plan_previews(self, video_path: Path) -> Optional[SpritePlan]:
+        """Plan the preview sprite of a video, or None if disabled, up to date or without video."""
+        if not self.previews:
+            return None
+        if self.previews.is_current(video_path):
+            self.logger.info("Preview sprite is up to date")
+            return None
+        try:
+            info = self.metadata.probe(str(video_path))
+        except Exception as e:
+            self.logger.warning(f"Cannot plan preview sprite: {e}")
+            return None
+        # 与 FFmpeg 的 v:N 一致，封面图也算作视频流
+        videos = [stream for stream in info.streams if stream.codec_type == 'video']
+        if len(videos) <= self.previews.video_stream:
+            return None
+        video = videos[self.previews.video_stream]
+        if not video.width or not video.height or video.attached_pic:
+            return None
+        return self.previews.plan(video_path, video.width, video.height)
+
+    def _build_previews(self, sprite: SpritePlan, chapters: List[ChapterMark]) -> bool:
+        """Render the remaining preview tiles and write the sprite and its index.
+
+        A failure is logged but does not fail the video: the chapters are already written.
+        """
+        chapter_parts = []
+        try:
+            if not sprite.tiles_done:
+                self._run_job(self.previews.interval_command(sprite), 'previews')
+            for i, times in enumerate(self.previews.chapter_batches([c.time for c in chapters])):
+                path = sprite.interval_path.with_name(f"{sprite.interval_path.stem}.{i}.tmp")
+                chapter_parts.append((times, path))
+                self._run_job(self.previews.chapter_command(sprite, times, path), 'previews')
+            count = self.previews.assemble(sprite, chapter_parts)
+            self.logger.info(f"Preview sprite written: {count} tiles of {sprite.width}x{sprite.height} "
+                             f"({self.previews.sprite_path(sprite.video).name})")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error building preview sprite: {e}")
+            return False
+        finally:
+            self.previews.cleanup([sprite.interval_path] + [path for _, path in chapter_parts])
+
+    def _sweep_chapters(self, video_path: Path) -> Optional[Tuple[List[ChapterMark], float]]:
+        """Run sweep mode on a video, reporting every parameter combination."""
+        duration = self.get_video_duration(str(video_path))
+        if duration is None:
+            return None
+
+        try:
+            results = self.sweep_parameters(str(video_path), duration)
+        except Exception as e:
+            self.logger.error(f"Error sweeping detection parameters: {e}")
+            return None
+        if self._stop_event.is_set():
+            return None
+
+        self.logger.info("  threshold  min_silence  chapters  mean length")
+        for r in results:
+            self.logger.info(f"  {r.noise_threshold_db:>6}dB  {r.min_silence:>10.2f}s  "
+                             f"{r.chapter_count:>8}  {r.mean_chapter_length:>10.1f}s")
+
+        best = self.pick_sweep_result(results)
+        if best:
+            self.logger.info(f"Best combination: {best.noise_threshold_db}dB, min_silence {best.min_silence}s "
+                             f"({best.chapter_count} chapters)")
+        else:
+            detection_config = self.config.get('detection', {})
+            best = next(r for r in results
+                        if r.noise_threshold_db == detection_config.get('noise_threshold_db', -30)
+                        and r.min_silence == detection_config.get('min_silence', 1.0))
+
+        extractor = self._with_detection(noise_threshold_db=best.noise_threshold_db,
+                                         min_silence=best.min_silence)
+        return extractor.generate_chapter_marks(best.silences, duration), duration
+
+    def _stream_chapters(self, video_path: Path) -> Optional[Tuple[List[ChapterMark], Optional[float]]]:
+        """Detect chapters in streaming mode, rewriting the chapter file as marks appear.
+
+        Returns the final chapters and the video duration (None for growing
+        files), or None on failure; the final outputs are left to the caller.
+        """
+        # 正在录制的文件时长会变化，此时不使用 skip_tail
+        duration = None
+        if not self.config.get('streaming', {}).get('growing', False):
+            duration = self.get_video_duration(str(video_path))
+            if duration is None:
+                return None
+
+        chapters = []
+        try:
+            for chapter in self.stream_chapter_marks(str(video_path), duration):
+                chapters.append(chapter)
+                self.logger.info(f"  {self.format_time(chapter.time)} - {chapter.title} (provisional)")
+                # 临时结果只写文件，嵌入视频在全部完成后进行一次
+                if not self.write_outputs(video_path, chapters, duration, embed=False):
+                    return None
+        except Exception as e:
+            self.logger.error(f"Error streaming silences: {e}")
+            return None
+        if self._stop_event.is_set():
+            return None
+
+        return chapters, duration
+
+    def write_outputs(self, video_path: Path, chapters: List[ChapterMark],
+                      duration: Optional[float] = None, embed: bool = True) -> bool:
+        """Write the chapters of a video with every configured writer."""
+        for writer in self.writers:
+            if writer.name == 'embed' and not embed:
+                continue
+            try:
+                path = writer.write(video_path, chapters, duration)
+                self.logger.info(f"Chapters written ({writer.name}): {path}")
+            except Exception as e:
+                self.logger.error(f"Error writing {writer.name} chapters: {e}")
+                return False
+        return True
 
-        # Write chapter file
-        success = self.write_chapter_file(chapters, str(output_path))
+    def _write_chapters(self, video_path: Path, chapters: List[ChapterMark],
+                        duration: Optional[float] = None) -> bool:
+        """Write the chapter outputs for a video and log the result."""
+        success = self.write_outputs(video_path, chapters, duration)
 
         if success:
             self.logger.info(f"Successfully processed: {video_path.name}")
@@ -367,64 +1251,332 @@ class VideoChapterExtractor:
         return success
 
     def process_directory(self) -> int:
-        """Process all video files in the configured directory."""
+        """Process all video files in the configured directory.
+
+        Files are discovered lazily, so the first video is processed while the
+        rest of a large tree is still being listed.
+        """
         input_config = self.config.get('input', {})
-        path = input_config.get('path', '.')
         pattern = input_config.get('pattern', '*.mp4')
-
-        directory = Path(path)
+        directory = Path(input_config.get('path', '.'))
 
         if not directory.exists() or not directory.is_dir():
             self.logger.error(f"Directory not found: {directory}")
             return 0
 
-        # Handle multiple formats with curly braces
-        if '{' in pattern and '}' in pattern:
-            # Extract formats from pattern like "*.{mp4,mkv,avi}"
-            start = pattern.find('{')
-            end = pattern.find('}')
-            if start != -1 and end != -1:
-                prefix = pattern[:start]
-                suffix = pattern[end+1:]
-                formats = pattern[start+1:end].split(',')
-
-                video_files = []
-                for fmt in formats:
-                    fmt_pattern = prefix + fmt.strip() + suffix
-                    video_files.extend(directory.glob(fmt_pattern))
-            else:
-                video_files = list(directory.glob(pattern))
-        else:
-            video_files = list(directory.glob(pattern))
-
-        if not video_files:
+        counts = {'found': 0, 'up_to_date': 0, 'resumed': 0, 'interrupted': 0, 'retried': 0}
+
+        def found(files: Iterable[Path]) -> Iterator[Path]:
+            for f in files:
+                counts['found'] += 1
+                yield f
+
+        video_files = found(discover_inputs(input_config))
+
+        manifest = None
+        if input_config.get('incremental', False):
+            manifest_name = self.config.get('output', {}).get('manifest', '.mpvchapter_manifest.json')
+            manifest = ChapterManifest(manifest_name, self.config_hash())
+
+            def changed(files: Iterable[Path]) -> Iterator[Path]:
+                for f in files:
+                    if manifest.is_up_to_date(f, self.get_output_path(f)) and self.outputs_exist(f):
+                        counts['up_to_date'] += 1
+                    else:
+                        yield f
+
+            video_files = changed(video_files)
+
+        journal = None
+        if input_config.get('resume', False):
+            journal_path = input_config.get('journal', '.mpvchapter_journal.jsonl')
+            journal = JobJournal(journal_path, self.config_hash())
+
+            def unfinished(files: Iterable[Path]) -> Iterator[Path]:
+                for f in files:
+                    if journal.is_done(f) and self.outputs_exist(f):
+                        self.logger.debug(f"Already finished in previous run: {f.name}")
+                        counts['resumed'] += 1
+                        continue
+                    state = journal.state(f)
+                    if state in (QUEUED, RUNNING):
+                        counts['interrupted'] += 1
+                    elif state == FAILED:
+                        counts['retried'] += 1
+                    journal.queued(f)
+                    yield f
+
+            video_files = unfinished(video_files)
+
+        results = []
+        completed = False
+        try:
+            results = self.process_videos(self._prefetch(video_files), manifest, journal)
+            completed = all(result.success for result in results)
+        finally:
+            if manifest:
+                manifest.save()
+            if journal:
+                journal.close(completed)
+
+        up_to_date, resumed = counts['up_to_date'], counts['resumed']
+        if not counts['found']:
             self.logger.warning(f"No video files found in {directory} matching pattern: {pattern}")
             return 0
+        self.logger.info(f"Found {counts['found']} video files")
+        if up_to_date:
+            self.logger.info(f"Skipped {up_to_date} up-to-date files")
+        if resumed or counts['interrupted'] or counts['retried']:
+            self.logger.info(f"Resumed previous run: skipped {resumed} finished files, "
+                             f"processed {counts['interrupted']} interrupted and "
+                             f"{counts['retried']} failed files again")
+        success_count = sum(1 for result in results if result.success)
+
+        failures = [result for result in results if not result.success]
+        for result in failures:
+            reason = result.error or "see log above"
+            self.logger.error(f"Failed: {result.path.name} ({reason})")
+
+        self.logger.info(f"Successfully processed {success_count}/{len(results)} files")
+        # 已是最新的文件以及上次运行已完成的文件同样视为成功
+        return success_count + up_to_date + resumed
+
+    def _prefetch(self, video_files: Iterable[Path], batch: int = 32) -> Iterator[Path]:
+        """Pass files through, probing them concurrently in small batches ahead of processing."""
+        chunk = []
+        for f in video_files:
+            chunk.append(f)
+            if len(chunk) >= batch:
+                self.metadata.probe_many(chunk)
+                yield from chunk
+                chunk = []
+        if len(chunk) > 1:
+            self.metadata.probe_many(chunk)
+        yield from chunk
+
+    def watch_directory(self) -> int:
+        """Watch the configured directory and process videos as they arrive.
+
+        Runs until interrupted. Files are handed to a bounded queue served by
+        the configured number of workers; when the queue is full the watcher
+        waits, so a burst of new files cannot pile up unbounded work.
+        """
+        input_config = self.config.get('input', {})
+        watch_config = self.config.get('watch', {})
+        directory = Path(input_config.get('path', '.'))
+        pattern = input_config.get('pattern', '*.mp4')
 
-        self.logger.info(f"Found {len(video_files)} video files to process")
-
-        success_count = 0
-        total_files = len(video_files)
+        if not directory.is_dir():
+            self.logger.error(f"Directory not found: {directory}")
+            return 0
 
-        for i, video_file in enumerate(video_files, 1):
+        watcher = FolderWatcher(
+            directory, pattern_matcher(pattern),
+            settle=watch_config.get('settle_seconds', 5.0),
+            poll_interval=watch_config.get('poll_interval', 2.0),
+            backend=watch_config.get('backend', 'auto'),
+            logger=self.logger
+        )
+
+        if watch_config.get('initial_scan', False):
+            self.process_directory()
+
+        manifest = None
+        if input_config.get('incremental', False):
+            manifest_name = self.config.get('output', {}).get('manifest', '.mpvchapter_manifest.json')
+            manifest = ChapterManifest(manifest_name, self.config_hash())
+
+        workers = self.get_worker_count()
+        self._concurrent = workers > 1
+        jobs = queue.Queue(maxsize=max(1, watch_config.get('queue_size', 100)))
+        queued = set()
+        queued_lock = threading.Lock()
+        # 处理完成时文件的 (大小, 修改时间)，嵌入章节等自身引起的变化不会触发重复处理
+        processed = {}
+        started = 0
+        succeeded = 0
+
+        def fingerprint(path: Path) -> Optional[Tuple[int, int]]:
             try:
-                if self.config.get('logging', {}).get('show_progress', True):
-                    self.logger.info(f"Processing {i}/{total_files}: {video_file.name}")
-
-                if self.process_video(str(video_file)):
-                    success_count += 1
-            except Exception as e:
-                self.logger.error(f"Error processing {video_file.name}: {e}")
-
-        self.logger.info(f"Successfully processed {success_count}/{total_files} files")
-        return success_count
-
-def load_config() -> Dict[str, Any]:
-    """Load configuration from config.json file."""
-    config_path = Path('config.json')
+                stat = path.stat()
+            except OSError:
+                return None
+            return stat.st_size, stat.st_mtime_ns
+
+        def work():
+            nonlocal started, succeeded
+            while True:
+                path = jobs.get()
+                if path is None:
+                    return
+                with queued_lock:
+                    started += 1
+                    index = started
+                result = self._process_one(path, index, 0, manifest)
+                if result.success:
+                    processed[path] = fingerprint(path)
+                    with queued_lock:
+                        succeeded += 1
+                    if manifest:
+                        manifest.record(path, self.get_output_path(path))
+                        manifest.save()
+                with queued_lock:
+                    queued.discard(path)
+
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        def terminate(*_):
+            raise KeyboardInterrupt
+
+        stop = threading.Event()
+        # 作为服务运行时 SIGTERM 与 Ctrl+C 一样退出
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGTERM, terminate)
+
+        self.logger.info(f"Watching {directory} for {pattern} ({watcher.backend}, "
+                         f"{workers} workers, settle {watcher.settle}s)")
+        try:
+            for path in watcher.watch(stop):
+                with queued_lock:
+                    if path in queued:
+                        continue
+                if processed.get(path) == fingerprint(path):
+                    continue
+                if manifest and manifest.is_up_to_date(path, self.get_output_path(path)):
+                    continue
+                with queued_lock:
+                    queued.add(path)
+                self.logger.info(f"New video: {path.name}")
+                while not stop.is_set():
+                    try:
+                        jobs.put(path, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+        except KeyboardInterrupt:
+            self.logger.warning("Interrupted, stopping all FFmpeg processes...")
+            self.stop()
+        finally:
+            stop.set()
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+            if self._stop_event.is_set():
+                # 中断时丢弃尚未开始的任务
+                while True:
+                    try:
+                        jobs.get_nowait()
+                    except queue.Empty:
+                        break
+            for _ in threads:
+                jobs.put(None)
+            for thread in threads:
+                thread.join()
+
+        self.logger.info(f"Stopped watching, processed {succeeded} videos")
+        return succeeded
+
+    def get_worker_count(self) -> int:
+        """Get the number of concurrent workers from configuration."""
+        input_config = self.config.get('input', {})
+        workers = input_config.get('workers', 1)
+
+        # 0 或负数表示使用全部 CPU 核心
+        if not isinstance(workers, int) or workers <= 0:
+            workers = os.cpu_count() or 1
+        return workers
+
+    def _process_one(self, video_file: Path, index: int, total: int,
+                     manifest: Optional[ChapterManifest] = None,
+                     journal: Optional[JobJournal] = None) -> ProcessResult:
+        """Process one video of a batch, capturing any failure in the result."""
+        self._log_context.video = video_file.name if self._concurrent else None
+        try:
+            if self._stop_event.is_set():
+                return ProcessResult(video_file, False, "cancelled")
+
+            if self.config.get('logging', {}).get('show_progress', True):
+                progress = f"{index}/{total}" if total else f"#{index}"
+                self.logger.info(f"Processing {progress}: {video_file.name}")
+
+            if journal:
+                journal.running(video_file)
+            success = self.process_video(str(video_file))
+            if success and manifest:
+                manifest.record(video_file, self.get_output_path(video_file))
+            if journal:
+                if success:
+                    journal.done(video_file)
+                elif not self._stop_event.is_set():
+                    # 被中断的文件保持 running 状态，下次运行时重新处理
+                    journal.failed(video_file)
+            return ProcessResult(video_file, success)
+        except Exception as e:
+            self.logger.error(f"Error processing {video_file.name}: {e}")
+            if journal:
+                journal.failed(video_file, str(e))
+            return ProcessResult(video_file, False, str(e))
+        finally:
+            self._log_context.video = None
+            self._log_context.duration = None
+
+    def log_job_summary(self):
+        """Log the FFmpeg jobs that were throttled or killed by the resource limits."""
+        lines = self.runner.summary()
+        if lines:
+            self.logger.warning(f"{len(lines)} FFmpeg jobs were throttled or killed:")
+            for line in lines:
+                self.logger.warning(f"  {line}")
+
+    def process_videos(self, video_files: Iterable[Path],
+                       manifest: Optional[ChapterManifest] = None,
+                       journal: Optional[JobJournal] = None) -> List[ProcessResult]:
+        """Process videos with the configured worker pool, returning results in input order.
+
+        video_files may be a lazy iterator; it is consumed only as fast as the
+        workers take files, with at most two files per worker waiting.
+        """
+        total = len(video_files) if isinstance(video_files, list) else 0
+        workers = self.get_worker_count()
+        if total:
+            workers = min(workers, total)
+        self._concurrent = workers > 1
+
+        if not self._concurrent:
+            results = [self._process_one(f, i, total, manifest, journal) for i, f in enumerate(video_files, 1)]
+            self.log_job_summary()
+            return results
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        results = []
+        futures = deque()
+        try:
+            for i, f in enumerate(video_files, 1):
+                if i == 1:
+                    self.logger.info(f"Processing with {workers} workers")
+                futures.append(executor.submit(self._process_one, f, i, total, manifest, journal))
+                while len(futures) >= workers * 2:
+                    results.append(futures.popleft().result())
+            while futures:
+                results.append(futures.popleft().result())
+            self.log_job_summary()
+            return results
+        except KeyboardInterrupt:
+            self.logger.warning("Interrupted, stopping all FFmpeg processes...")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stop()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Load configuration from a JSON file (config.json in the current directory by default)."""
+    config_path = Path(path or 'config.json')
 
     if not config_path.exists():
-        print("Error: config.json not found!")
+        print(f"Error: {config_path} not found!")
         print("Please create a config.json file with your settings.")
         sys.exit(1)
 
@@ -433,18 +1585,189 @@ def load_config() -> Dict[str, Any]:
             config = json.load(f)
         return config
     except Exception as e:
-        print(f"Error loading config.json: {e}")
+        print(f"Error loading {config_path}: {e}")
         sys.exit(1)
 
-def main():
+def merge_config(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of base with overrides merged in; nested sections are merged key by key."""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+def parse_override(text: str) -> Dict[str, Any]:
+    """Parse a ``section.key=value`` override; the value is read as JSON, or else kept as a string."""
+    key, sep, raw = text.partition('=')
+    if not sep or not key:
+        raise ValueError(f"Invalid override (expected section.key=value): {text}")
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = raw
+    for part in reversed(key.split('.')):
+        value = {part: value}
+    return value
+
+# 常驻进程中按配置复用提取器，FFmpeg 查找、缓存连接和输出格式只初始化一次
+_extractors: 'OrderedDict[str, VideoChapterExtractor]' = OrderedDict()
+_extractors_lock = threading.Lock()
+MAX_EXTRACTORS = 8
+
+def get_extractor(config: Dict[str, Any]) -> VideoChapterExtractor:
+    """Get a shared extractor for a configuration, creating it on first use."""
+    key = json.dumps(config, sort_keys=True)
+    with _extractors_lock:
+        extractor = _extractors.get(key)
+        if extractor is None:
+            extractor = VideoChapterExtractor(copy.deepcopy(config))
+            _extractors[key] = extractor
+            while len(_extractors) > MAX_EXTRACTORS:
+                _extractors.popitem(last=False)
+        _extractors.move_to_end(key)
+        return extractor
+
+def extract_chapters(path: str, config: Optional[Dict[str, Any]] = None, write: bool = False,
+                     **overrides) -> List[ChapterMark]:
+    """Detect the chapters of one video.
+
+    config is a configuration dictionary like config.json (built-in defaults
+    when omitted); keyword arguments override whole sections or single keys
+    of it, e.g. ``detection={'min_gap': 10}``. With write=True the configured
+    output files are written as well.
+
+    Raises FileNotFoundError if the video does not exist and RuntimeError if
+    no chapters could be extracted.
+    """
+    extractor = get_extractor(merge_config(config or {}, overrides))
+    video_path = Path(path)
+    if not video_path.exists():
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    result = extractor.compute_chapters(str(video_path))
+    if result is None:
+        raise RuntimeError(f"Failed to extract chapters from {video_path}")
+    chapters, duration = result
+    if write and not extractor.write_outputs(video_path, chapters, duration):
+        raise RuntimeError(f"Failed to write chapters for {video_path}")
+    return chapters
+
+def chapters_to_json(chapters: List[ChapterMark]) -> List[Dict[str, Any]]:
+    """Chapter marks as JSON-serialisable dictionaries."""
+    return [{'time': round(c.time, 3), 'title': c.title, 'index': c.index} for c in chapters]
+
+def handle_request(config: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer one worker-mode request: ``{"path": ..., "config": {...}, "write": false}``."""
+    if not request.get('path'):
+        raise ValueError("request has no path")
+    chapters = extract_chapters(request['path'], config, write=request.get('write', False),
+                                **request.get('config', {}))
+    return {'ok': True, 'path': request['path'], 'chapters': chapters_to_json(chapters)}
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract chapters from videos by detecting silences.")
+    parser.add_argument('paths', nargs='*',
+                        help='videos or directories to process (default: input.path from the config)')
+    parser.add_argument('-c', '--config',
+                        help='configuration file (default: config.json, optional when paths are given)')
+    parser.add_argument('-s', '--set', dest='overrides', action='append', default=[], metavar='SECTION.KEY=VALUE',
+                        help='override a configuration value, e.g. detection.min_gap=10 (repeatable)')
+    parser.add_argument('-j', '--jobs', type=int, help='number of videos processed in parallel (input.workers)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the chapters as JSON lines instead of writing output files')
+    parser.add_argument('--serve', action='store_true',
+                        help='read JSON requests from stdin and write results to stdout, one per line')
+    return parser.parse_args(argv)
+
+def build_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """Load the configuration file and apply the command line overrides."""
+    if args.config or Path('config.json').exists() or not (args.paths or args.serve):
+        config = load_config(args.config)
+    else:
+        config = {}
+
+    for text in args.overrides:
+        config = merge_config(config, parse_override(text))
+    if args.jobs is not None:
+        config = merge_config(config, {'input': {'workers': args.jobs}})
+    return config
+
+def expand_paths(paths: List[str], input_config: Dict[str, Any]) -> Iterator[Path]:
+    """Yield the given files, and the matching videos of the given directories."""
+    for path in paths:
+        if Path(path).is_dir():
+            yield from discover_inputs({**input_config, 'path': path})
+        else:
+            yield Path(path)
+
+def print_chapters(config: Dict[str, Any], paths: List[str]) -> bool:
+    """Print the chapters of every video as one JSON line each; return whether all succeeded."""
+    input_config = config.get('input', {})
+    extractor = get_extractor(config)
+
+    def describe(video_file: Path) -> Dict[str, Any]:
+        try:
+            return {'path': str(video_file), 'chapters': chapters_to_json(extract_chapters(str(video_file), config))}
+        except Exception as e:
+            return {'path': str(video_file), 'error': str(e)}
+
+    def emit(future) -> bool:
+        result = future.result()
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+        return 'error' not in result
+
+    succeeded = True
+    workers = extractor.get_worker_count()
+    video_files = expand_paths(paths or [input_config.get('path', '.')], input_config)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 与 process_videos 相同，最多提交 workers * 2 个文件，目录扫描随处理进度进行
+        futures = deque()
+        try:
+            for video_file in video_files:
+                futures.append(executor.submit(describe, video_file))
+                while len(futures) >= workers * 2:
+                    succeeded = emit(futures.popleft()) and succeeded
+            while futures:
+                succeeded = emit(futures.popleft()) and succeeded
+        except KeyboardInterrupt:
+            extractor.stop()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return succeeded
+
+def serve(config: Dict[str, Any]) -> int:
+    """Run the persistent JSON-lines worker on stdin/stdout."""
+    # 标准输出只用于响应，日志写到标准错误
+    extractor = get_extractor(config)
+    jobs = extractor.get_worker_count()
+    extractor.logger.info(f"Worker ready (ffmpeg: {extractor.ffmpeg_path}, {jobs} jobs)")
+    worker = JsonLinesWorker(lambda request: handle_request(config, request), jobs=jobs, logger=extractor.logger)
+    try:
+        return worker.serve()
+    except KeyboardInterrupt:
+        for cached in list(_extractors.values()):
+            cached.stop()
+        return 0
+
+def main(argv: Optional[List[str]] = None):
     """Main entry point."""
+    args = parse_args(argv)
+    config = build_config(args)
+
+    if args.serve:
+        serve(config)
+        return
+
+    if args.json:
+        sys.exit(0 if print_chapters(config, args.paths) else 1)
+
     print("MPVChapter - Automatic Video Chapter Extraction")
     print("=" * 50)
 
-    # Load configuration
-    config = load_config()
-
     # Create extractor and process
+    extractor = None
     try:
         extractor = VideoChapterExtractor(config)
 
@@ -452,7 +1775,18 @@ def main():
         input_config = config.get('input', {})
         batch_mode = input_config.get('batch_mode', True)
 
-        if batch_mode:
+        if args.paths:
+            # Files and directories from the command line
+            results = extractor.process_videos(expand_paths(args.paths, input_config))
+            succeeded = sum(1 for r in results if r.success)
+            print(f"\n{'✅' if succeeded == len(results) and results else '❌'} "
+                  f"Successfully processed {succeeded} of {len(results)} video files")
+            if succeeded < len(results) or not results:
+                sys.exit(1)
+        elif config.get('watch', {}).get('enabled', False):
+            # Daemon mode: process new videos as they arrive
+            extractor.watch_directory()
+        elif batch_mode:
             # Batch processing
             success_count = extractor.process_directory()
             if success_count > 0:
@@ -462,47 +1796,29 @@ def main():
                 sys.exit(1)
         else:
             # Single file processing
-            path = input_config.get('path', '.')
-            pattern = input_config.get('pattern', '*.mp4')
-
-            directory = Path(path)
+            directory = Path(input_config.get('path', '.'))
 
             if not directory.exists() or not directory.is_dir():
                 print(f"Directory not found: {directory}")
                 sys.exit(1)
 
-            # Handle multiple formats with curly braces
-            if '{' in pattern and '}' in pattern:
-                # Extract formats from pattern like "*.{mp4,mkv,avi}"
-                start = pattern.find('{')
-                end = pattern.find('}')
-                if start != -1 and end != -1:
-                    prefix = pattern[:start]
-                    suffix = pattern[end+1:]
-                    formats = pattern[start+1:end].split(',')
-
-                    video_files = []
-                    for fmt in formats:
-                        fmt_pattern = prefix + fmt.strip() + suffix
-                        video_files.extend(directory.glob(fmt_pattern))
-                else:
-                    video_files = list(directory.glob(pattern))
-            else:
-                video_files = list(directory.glob(pattern))
-
-            if not video_files:
-                print(f"No video files found matching pattern: {pattern}")
+            video_file = next(discover_inputs(input_config), None)
+            if video_file is None:
+                print(f"No video files found matching pattern: {input_config.get('pattern', '*.mp4')}")
                 sys.exit(1)
 
             # Process first file only
-            success = extractor.process_video(str(video_files[0]))
+            success = extractor.process_video(str(video_file))
             if success:
-                print(f"\n✅ Successfully processed: {video_files[0].name}")
+                print(f"\n✅ Successfully processed: {video_file.name}")
             else:
-                print(f"\n❌ Failed to process: {video_files[0].name}")
+                print(f"\n❌ Failed to process: {video_file.name}")
                 sys.exit(1)
 
     except KeyboardInterrupt:
+        # FFmpeg 在独立的进程组中运行，收不到终端的 Ctrl+C
+        if extractor:
+            extractor.stop()
         print("\n⏹️  Processing interrupted by user")
         sys.exit(1)
     except Exception as e:
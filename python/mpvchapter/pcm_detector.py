@@ -0,0 +1,195 @@
+"""
+In-process silence detection on raw PCM.
+
+FFmpeg only decodes the audio to mono signed 16-bit PCM on a pipe. Levels are
+computed here over fixed-size windows, so a single decode can be checked
+against several noise thresholds at once.
+
+NumPy is used when available (zero-copy ``frombuffer`` views on the read
+buffer); otherwise a pure Python fallback over ``memoryview`` is used, which
+gives the same results but is considerably slower.
+"""
+
+import math
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SAMPLE_BYTES = 2
+FULL_SCALE = 32768.0
+# Level reported for digital silence, well below any useful threshold
+SILENCE_FLOOR_DB = -120.0
+
+Segment = Tuple[float, float, float]
+
+def build_decode_command(ffmpeg_path: str, video_path: str, audio_stream: int = 0,
+                         sample_rate: int = 8000, decoder_threads: int = 0) -> List[str]:
+    """Build the FFmpeg command that writes mono s16le PCM to stdout."""
+    cmd = [ffmpeg_path, '-hide_banner', '-nostats', '-loglevel', 'error']
+    if decoder_threads:
+        cmd.extend(['-threads', str(decoder_threads)])
+    cmd.extend([
+        '-vn', '-sn', '-dn',
+        '-i', video_path,
+        '-map', f'0:a:{audio_stream}',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 's16le',
+        '-'
+    ])
+    return cmd
+
+def window_levels(data, window_samples: int, mode: str = 'rms'):
+    """Compute the level in dBFS of each complete window in a block of samples.
+
+    ``data`` must hold a whole number of windows. Returns a NumPy array when
+    NumPy is available, otherwise a list.
+    """
+    if np is not None:
+        samples = np.frombuffer(data, dtype='<i2').reshape(-1, window_samples)
+        if mode == 'peak':
+            levels = np.abs(samples.astype(np.int32)).max(axis=1) / FULL_SCALE
+        else:
+            values = samples.astype(np.float64)
+            levels = np.sqrt(np.einsum('ij,ij->i', values, values) / window_samples) / FULL_SCALE
+        with np.errstate(divide='ignore'):
+            db = 20.0 * np.log10(levels)
+        return np.maximum(db, SILENCE_FLOOR_DB)
+
+    samples = memoryview(data).cast('h')
+    result = []
+    for offset in range(0, len(samples), window_samples):
+        window = samples[offset:offset + window_samples]
+        if mode == 'peak':
+            level = max(abs(v) for v in window) / FULL_SCALE
+        else:
+            level = math.sqrt(sum(v * v for v in window) / window_samples) / FULL_SCALE
+        result.append(20.0 * math.log10(level) if level > 0 else SILENCE_FLOOR_DB)
+    return result
+
+class _ThresholdTracker:
+    """Tracks quiet runs of windows for a single noise threshold."""
+
+    def __init__(self, threshold_db: float, min_windows: int):
+        self.threshold_db = threshold_db
+        self.min_windows = min_windows
+        self.run_start: Optional[int] = None
+        self.runs: List[Tuple[int, int]] = []
+
+    def _close(self, end: int):
+        if end - self.run_start >= self.min_windows:
+            self.runs.append((self.run_start, end))
+        self.run_start = None
+
+    def feed(self, levels, first_index: int):
+        """Process levels for windows starting at ``first_index``."""
+        if np is not None:
+            quiet = levels < self.threshold_db
+            previous = self.run_start is not None
+            # Indices where the quiet/loud state changes, relative to the carried state
+            changes = np.flatnonzero(quiet != np.concatenate(([previous], quiet[:-1])))
+            for i in changes.tolist():
+                if quiet[i]:
+                    self.run_start = first_index + i
+                else:
+                    self._close(first_index + i)
+            return
+
+        for i, level in enumerate(levels):
+            if level < self.threshold_db:
+                if self.run_start is None:
+                    self.run_start = first_index + i
+            elif self.run_start is not None:
+                self._close(first_index + i)
+
+    def finish(self, end: int):
+        """Close a run still open at the end of the stream."""
+        if self.run_start is not None:
+            self._close(end)
+
+class PcmSilenceDetector:
+    """Detect silences for several thresholds from one stream of PCM samples."""
+
+    def __init__(self, thresholds_db: Iterable[float], min_silence: float,
+                 sample_rate: int = 8000, window: float = 0.01, mode: str = 'rms'):
+        self.sample_rate = sample_rate
+        self.window_samples = max(1, int(round(sample_rate * window)))
+        self.window_seconds = self.window_samples / sample_rate
+        self.mode = mode
+        min_windows = max(1, int(math.ceil(min_silence / self.window_seconds - 1e-9)))
+        self.trackers = [_ThresholdTracker(t, min_windows) for t in thresholds_db]
+        self.windows_seen = 0
+
+    @property
+    def chunk_bytes(self) -> int:
+        """Read size holding a whole number of windows (about 4 seconds at 8 kHz)."""
+        return self.window_samples * SAMPLE_BYTES * 4096
+
+    def feed(self, data):
+        """Feed a block of s16le samples holding a whole number of windows."""
+        levels = window_levels(data, self.window_samples, self.mode)
+        for tracker in self.trackers:
+            tracker.feed(levels, self.windows_seen)
+        self.windows_seen += len(levels)
+
+    def _to_seconds(self, run: Tuple[int, int]) -> Segment:
+        start, end = run
+        return (start * self.window_seconds, end * self.window_seconds,
+                (end - start) * self.window_seconds)
+
+    def finish(self) -> Dict[float, List[Segment]]:
+        """Return {threshold_db: [(start, end, duration), ...]}."""
+        results = {}
+        for tracker in self.trackers:
+            tracker.finish(self.windows_seen)
+            results[tracker.threshold_db] = [self._to_seconds(run) for run in tracker.runs]
+        return results
+
+    def _read_chunks(self, stream) -> Iterator[memoryview]:
+        """Read a binary stream in fixed-size chunks of whole windows."""
+        buffer = bytearray(self.chunk_bytes)
+        view = memoryview(buffer)
+        window_bytes = self.window_samples * SAMPLE_BYTES
+
+        while True:
+            filled = 0
+            while filled < len(buffer):
+                count = stream.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            if filled == 0:
+                break
+
+            # 末尾不足一个窗口的样本直接丢弃
+            usable = filled - filled % window_bytes
+            if usable:
+                yield view[:usable]
+            if filled < len(buffer):
+                break
+
+    def run(self, stream) -> Dict[float, List[Segment]]:
+        """Read an entire binary stream in fixed-size chunks and detect silences."""
+        for chunk in self._read_chunks(stream):
+            self.feed(chunk)
+        return self.finish()
+
+    def stream(self, stream) -> Iterator[Tuple[float, Segment]]:
+        """Yield (threshold_db, segment) as soon as each silence ends.
+
+        Closed runs are handed out and dropped after every chunk, so memory
+        does not grow with the length of the input.
+        """
+        for chunk in self._read_chunks(stream):
+            self.feed(chunk)
+            for tracker in self.trackers:
+                for run in tracker.runs:
+                    yield tracker.threshold_db, self._to_seconds(run)
+                tracker.runs.clear()
+
+        for threshold, segments in self.finish().items():
+            for segment in segments:
+                yield threshold, segment
@@ -0,0 +1,180 @@
+"""
+Precomputed seek-bar preview thumbnails.
+
+For each video two files are written next to it:
+
+- ``<video>.ext.thumbs.bgra``: every thumbnail as raw BGRA pixels, tile after
+  tile with no header, so a tile can be shown directly with mpv's
+  ``overlay-add <id> <x> <y> <file> <offset> bgra <w> <h> <stride>`` or read
+  by memory-mapping the file, without decoding any video
+- ``<video>.ext.thumbs.json``: the index, with the tile size and the byte
+  offset of every tile sorted by time::
+
+      {"version": 1, "format": "bgra", "width": 160, "height": 90,
+       "stride": 640, "tile_bytes": 57600, "interval": 10,
+       "tiles": [{"time": 0.0, "offset": 0, "chapter": false}, ...]}
+
+Tiles are taken every ``interval`` seconds, either as an extra output of the
+silencedetect pass or in a separate pass, plus one tile at the start of
+every chapter. The index records the video's size and modification time
+together with the options, so an up-to-date sprite is not rebuilt.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from chapter_writers import write_atomic
+
+INDEX_VERSION = 1
+
+# 每条 FFmpeg 命令最多处理的章节缩略图数（每个章节是一个单独的输入）
+CHAPTER_BATCH = 32
+
+@dataclass
+class SpritePlan:
+    """Previews to build for one video."""
+    video: Path
+    width: int
+    height: int
+    interval_path: Path
+    # 间隔缩略图已在静音检测的同一次 FFmpeg 运行中生成
+    tiles_done: bool = False
+
+    @property
+    def tile_bytes(self) -> int:
+        return self.width * self.height * 4
+
+class SpriteBuilder:
+    """Builds the FFmpeg commands for preview tiles and assembles sprite and index."""
+
+    def __init__(self, options: Dict[str, Any], ffmpeg: str = 'ffmpeg'):
+        self.ffmpeg = ffmpeg
+        self.interval = float(options.get('interval', 10))
+        self.width = int(options.get('width', 160))
+        self.chapters = options.get('chapters', True)
+        self.video_stream = options.get('video_stream', 0)
+
+    @staticmethod
+    def sprite_path(video: Path) -> Path:
+        return video.parent / (video.name + '.thumbs.bgra')
+
+    @staticmethod
+    def index_path(video: Path) -> Path:
+        return video.parent / (video.name + '.thumbs.json')
+
+    def tile_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Tile size for a video: the configured width, height by aspect ratio (even)."""
+        tile_height = max(2, int(round(self.width * height / width / 2)) * 2)
+        return self.width, tile_height
+
+    def _options(self) -> Dict[str, Any]:
+        return {'interval': self.interval, 'width': self.width, 'chapters': bool(self.chapters),
+                'video_stream': self.video_stream}
+
+    def is_current(self, video: Path) -> bool:
+        """Whether the sprite and index exist for this version of the video and these options."""
+        try:
+            with open(self.index_path(video), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            stat = video.stat()
+            sprite_size = self.sprite_path(video).stat().st_size
+        except (OSError, ValueError):
+            return False
+        return (index.get('version') == INDEX_VERSION
+                and index.get('options') == self._options()
+                and index.get('source') == {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                and sprite_size == index.get('tile_bytes', 0) * len(index.get('tiles', [])))
+
+    def plan(self, video: Path, width: int, height: int) -> SpritePlan:
+        tile_width, tile_height = self.tile_size(width, height)
+        # 隐藏的 .tmp 文件不会被监视目录模式当作新视频
+        interval_path = video.parent / f".{video.name}.thumbs.tmp"
+        return SpritePlan(video, tile_width, tile_height, interval_path)
+
+    def tile_filter(self, plan: SpritePlan) -> str:
+        # concat 要求各输入的 SAR 相同
+        return f"scale={plan.width}:{plan.height},setsar=1,format=bgra"
+
+    def output_args(self, plan: SpritePlan) -> List[str]:
+        """FFmpeg output that writes a tile every interval seconds to plan.interval_path."""
+        return [
+            '-map', f'0:v:{self.video_stream}',
+            '-vf', f"fps=1/{self.interval:g},{self.tile_filter(plan)}",
+            '-f', 'rawvideo', str(plan.interval_path),
+        ]
+
+    def interval_command(self, plan: SpritePlan) -> List[str]:
+        """Separate pass for the interval tiles (when they were not made during detection)."""
+        return [self.ffmpeg, '-hide_banner', '-nostats', '-y', '-an', '-sn', '-dn',
+                '-i', str(plan.video), *self.output_args(plan)]
+
+    def chapter_command(self, plan: SpritePlan, times: List[float], output: Path) -> List[str]:
+        """One tile per chapter start: each time is a separately seeked input, joined with concat."""
+        cmd = [self.ffmpeg, '-hide_banner', '-nostats', '-y']
+        chains = []
+        for i, t in enumerate(times):
+            cmd.extend(['-ss', f'{t:.3f}', '-an', '-sn', '-dn', '-i', str(plan.video)])
+            chains.append(f"[{i}:v:{self.video_stream}]trim=end_frame=1,setpts=PTS-STARTPTS,"
+                          f"{self.tile_filter(plan)}[t{i}]")
+        labels = ''.join(f"[t{i}]" for i in range(len(times)))
+        graph = ';'.join(chains + [f"{labels}concat=n={len(times)}:v=1:a=0[tiles]"])
+        return cmd + ['-filter_complex', graph, '-map', '[tiles]', '-f', 'rawvideo', str(output)]
+
+    def chapter_batches(self, chapter_times: List[float]) -> List[List[float]]:
+        times = sorted(set(round(t, 3) for t in chapter_times)) if self.chapters else []
+        return [times[i:i + CHAPTER_BATCH] for i in range(0, len(times), CHAPTER_BATCH)]
+
+    def assemble(self, plan: SpritePlan, chapter_parts: List[Tuple[List[float], Path]]) -> int:
+        """Concatenate the tile files into the sprite and write the index; return the tile count."""
+        sprite_path = self.sprite_path(plan.video)
+        tmp_path = sprite_path.with_name(sprite_path.name + '.tmp')
+        tiles = []
+        offset = 0
+        with open(tmp_path, 'wb') as out:
+            parts = [([k * self.interval for k in range(plan.interval_path.stat().st_size // plan.tile_bytes)],
+                      plan.interval_path, False)]
+            parts += [(times, path, True) for times, path in chapter_parts]
+            for times, path, chapter in parts:
+                # 只复制完整的图块，最后一块可能因解码在文件末尾提前结束而不完整
+                count = min(len(times), path.stat().st_size // plan.tile_bytes)
+                with open(path, 'rb') as src:
+                    remaining = count * plan.tile_bytes
+                    while remaining > 0:
+                        chunk = src.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        remaining -= len(chunk)
+                for t in times[:count]:
+                    tiles.append({'time': round(t, 3), 'offset': offset, 'chapter': chapter})
+                    offset += plan.tile_bytes
+        os.replace(tmp_path, sprite_path)
+
+        stat = plan.video.stat()
+        tiles.sort(key=lambda tile: (tile['time'], not tile['chapter']))
+        index = {
+            'version': INDEX_VERSION,
+            'format': 'bgra',
+            'sprite': sprite_path.name,
+            'width': plan.width,
+            'height': plan.height,
+            'stride': plan.width * 4,
+            'tile_bytes': plan.tile_bytes,
+            'interval': self.interval,
+            'options': self._options(),
+            'source': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+            'tiles': tiles,
+        }
+        write_atomic(self.index_path(plan.video), json.dumps(index, separators=(',', ':')))
+        return len(tiles)
+
+    @staticmethod
+    def cleanup(paths: List[Path]):
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Regression suite for mpvchapter on synthetic fixtures with known silences.
+
+Each fixture is a tone that pauses for LONG_SILENCE seconds at the start of
+every period (a chapter break) and for SHORT_PAUSE seconds in the middle of
+it (which must not become a chapter), so the expected chapter times are known
+exactly. For every pipeline and fixture length the suite measures throughput
+(media seconds per wall second), peak memory and chapter accuracy, and can
+compare the results with a stored baseline, exiting with status 1 when
+throughput drops, accuracy gets worse or chapter positions move.
+
+With --stub no FFmpeg is needed: silencedetect stderr is synthesised from the
+ground truth (or replayed from files captured with --record) and fed through
+the real parser, so the parsing and threshold code can be profiled on their
+own.
+
+Usage:
+    python regression.py --save-baseline baseline.json
+    python regression.py --baseline baseline.json
+    python regression.py --stub --durations 60 3600 21600 --profile
+    python regression.py --record stderr_dir
+    python regression.py --stub --replay stderr_dir
+"""
+
+import argparse
+import bisect
+import copy
+import cProfile
+import json
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark import BASE_CONFIG, PIPELINES
+from mpvchapter import VideoChapterExtractor
+
+# Fixture timing (seconds): a chapter break every PERIOD, a short pause mid-period
+PERIOD = 20.0
+LONG_SILENCE = 3.0
+SHORT_PAUSE = 0.6
+
+# Chapter accuracy tolerance (seconds) and allowed drift from the baseline
+MATCH_TOLERANCE = 0.5
+POSITION_TOLERANCE = 0.05
+
+SUITE_CONFIG = {
+    'detection': {
+        'noise_threshold_db': -30,
+        'min_silence': 1.0,
+        'safety_ratio': 0.10,
+        'min_gap': 3.0,
+        'skip_head': 2.0,
+        'skip_tail': 2.0,
+    },
+    'adaptive': {
+        'enabled': True,
+        'adaptive_ratio': 0.3,
+    },
+}
+
+def suite_config(overrides: Dict[str, Any], telemetry: bool = False) -> Dict[str, Any]:
+    config = copy.deepcopy(BASE_CONFIG)
+    config['detection'].update(SUITE_CONFIG['detection'])
+    config['detection'].update(overrides)
+    config['adaptive'] = dict(SUITE_CONFIG['adaptive'])
+    if telemetry:
+        # 只用于读取 FFmpeg 的峰值内存，不输出进度
+        config['telemetry'] = {'enabled': True, 'jsonl': '', 'console_interval': 1e9}
+    return config
+
+def ground_truth(duration: float) -> Tuple[List[Tuple[float, float]], List[float]]:
+    """Return (all silences, expected chapter times) of a fixture."""
+    detection = SUITE_CONFIG['detection']
+    silences = []
+    chapters = [0.0]
+    start = 0.0
+    while start < duration:
+        silences.append((start, min(start + LONG_SILENCE, duration)))
+        chapter = start + LONG_SILENCE - detection['safety_ratio'] * LONG_SILENCE
+        if (detection['skip_head'] <= chapter <= duration - detection['skip_tail'] and
+                chapter - chapters[-1] >= detection['min_gap']):
+            chapters.append(chapter)
+        pause = start + PERIOD / 2
+        if pause < duration:
+            silences.append((pause, min(pause + SHORT_PAUSE, duration)))
+        start += PERIOD
+    return silences, chapters
+
+def generate_audio_fixture(ffmpeg: str, path: Path, duration: int):
+    """Generate an audio-only fixture following the ground-truth pattern."""
+    if path.exists():
+        return
+
+    half = PERIOD / 2
+    enable = (f"lt(mod(t,{PERIOD}),{LONG_SILENCE})+"
+              f"between(mod(t,{PERIOD}),{half},{half + SHORT_PAUSE})")
+    cmd = [
+        ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-af', f"volume=enable='{enable}':volume=0",
+        '-c:a', 'aac',
+        str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+def synthesize_stderr(path: Path, duration: float):
+    """Write silencedetect output for the ground truth, with stats lines in between."""
+    if path.exists():
+        return
+
+    silences, _ = ground_truth(duration)
+    # silencedetect 只报告不短于 min_silence 的静音
+    min_silence = SUITE_CONFIG['detection']['min_silence']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Input #0, lavfi, from 'synthetic':\n")
+        for start, end in silences:
+            if end - start < min_silence:
+                continue
+            f.write(f"[silencedetect @ 0x5581c0] silence_start: {start:.6g}\n")
+            f.write(f"size=N/A time={end:.2f} bitrate=N/A speed=250x\n")
+            if end < duration:
+                f.write(f"[silencedetect @ 0x5581c0] silence_end: {end:.6g} | "
+                        f"silence_duration: {end - start:.6g}\n")
+
+class ReplayProcess:
+    """Stands in for an FFmpeg process by replaying recorded stderr."""
+
+    def __init__(self, stderr_path: Path):
+        self.stderr = open(stderr_path, 'r', encoding='utf-8', errors='replace')
+        self.pid = None
+        self.returncode = None
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        self.stderr.close()
+        self.returncode = 0
+        return 0
+
+    def terminate(self):
+        self.wait()
+
+    kill = terminate
+
+class ReplayExtractor(VideoChapterExtractor):
+    """VideoChapterExtractor whose FFmpeg runs are replaced by recorded stderr."""
+
+    def __init__(self, config: Dict[str, Any], stderr_path: Path):
+        self.stderr_path = stderr_path
+        super().__init__(config)
+
+    def _find_ffmpeg(self) -> str:
+        return 'ffmpeg'
+
+    def _start_process(self, cmd: List[str], name: Optional[str] = None, **kwargs) -> ReplayProcess:
+        return ReplayProcess(self.stderr_path)
+
+def score(chapters: List[float], expected: List[float]) -> Dict[str, float]:
+    """Match chapters to the expected times within MATCH_TOLERANCE."""
+    chapters = sorted(chapters)
+    used = set()
+    errors = []
+    for target in expected:
+        i = bisect.bisect_left(chapters, target)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(chapters) and j not in used]
+        best = min(candidates, key=lambda j: abs(chapters[j] - target), default=None)
+        if best is not None and abs(chapters[best] - target) <= MATCH_TOLERANCE:
+            used.add(best)
+            errors.append(abs(chapters[best] - target))
+    return {
+        'recall': len(errors) / len(expected) if expected else 1.0,
+        'precision': len(errors) / len(chapters) if chapters else 1.0,
+        'mean_error': sum(errors) / len(errors) if errors else 0.0,
+    }
+
+def run_case(make_extractor, media_path: Path, duration: float, trace_memory: bool) -> Dict[str, Any]:
+    """Time detection plus chapter generation on one fixture."""
+    extractor = make_extractor()
+    start = time.perf_counter()
+    silences = extractor.detect_silences(str(media_path))
+    chapters = extractor.generate_chapter_marks(silences, duration)
+    elapsed = time.perf_counter() - start
+
+    # Python 侧的峰值内存单独测量一次，避免 tracemalloc 影响计时
+    python_peak = None
+    if trace_memory:
+        tracemalloc.start()
+        extractor = make_extractor()
+        extractor.generate_chapter_marks(extractor.detect_silences(str(media_path)), duration)
+        python_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    ffmpeg_peak = None
+    if extractor.telemetry and extractor.telemetry.finished:
+        ffmpeg_peak = max((s.peak_rss or 0) for s in extractor.telemetry.finished) or None
+
+    times = [round(c.time, 3) for c in chapters]
+    result = {
+        'media_seconds': duration,
+        'elapsed': elapsed,
+        'throughput': duration / elapsed if elapsed > 0 else float('inf'),
+        'silences': len(silences),
+        'python_peak_bytes': python_peak,
+        'ffmpeg_peak_rss_bytes': ffmpeg_peak,
+        'chapters': times,
+    }
+    result.update(score(times, ground_truth(duration)[1]))
+    return result
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """Return a description of every regression against the baseline."""
+    problems = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            problems.append(f"{key}: throughput {result['throughput']:.1f}x < "
+                            f"baseline {base['throughput']:.1f}x (-{tolerance:.0%} allowed)")
+        for metric in ('recall', 'precision'):
+            if result[metric] < base[metric] - 1e-9:
+                problems.append(f"{key}: {metric} {result[metric]:.3f} < baseline {base[metric]:.3f}")
+        if len(result['chapters']) != len(base['chapters']):
+            problems.append(f"{key}: {len(result['chapters'])} chapters, baseline had {len(base['chapters'])}")
+        else:
+            moved = max((abs(a - b) for a, b in zip(result['chapters'], base['chapters'])), default=0.0)
+            if moved > POSITION_TOLERANCE:
+                problems.append(f"{key}: chapter positions moved by up to {moved:.3f}s")
+    return problems
+
+def format_bytes(value: Optional[int]) -> str:
+    return f"{value / 2**20:.1f}M" if value else '-'
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--durations', type=int, nargs='+', default=[60, 600, 3600],
+                        help='fixture durations in seconds (up to 21600 for 6 hours)')
+    parser.add_argument('--workdir', default='bench_media',
+                        help='directory for generated fixtures')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='FFmpeg executable')
+    parser.add_argument('--stub', action='store_true',
+                        help='replay silencedetect stderr instead of running FFmpeg')
+    parser.add_argument('--replay', metavar='DIR',
+                        help='with --stub, replay stderr recorded with --record from DIR')
+    parser.add_argument('--record', metavar='DIR',
+                        help='record silencedetect stderr of each fixture into DIR and exit')
+    parser.add_argument('--profile', action='store_true', help='print a cProfile summary')
+    parser.add_argument('--baseline', help='compare with this baseline and fail on regressions')
+    parser.add_argument('--save-baseline', help='store the results as a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative throughput drop against the baseline')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    if args.record:
+        record_dir = Path(args.record)
+        record_dir.mkdir(parents=True, exist_ok=True)
+        extractor = VideoChapterExtractor(suite_config({}))
+        for duration in args.durations:
+            media_path = workdir / f'tones_{duration}s.m4a'
+            generate_audio_fixture(args.ffmpeg, media_path, duration)
+            cmd = extractor.build_silencedetect_command(str(media_path))
+            stderr = subprocess.run(cmd, capture_output=True, text=True).stderr
+            (record_dir / f'tones_{duration}s.stderr').write_text(stderr, encoding='utf-8')
+            print(f"Recorded {record_dir / f'tones_{duration}s.stderr'}", file=sys.stderr)
+        return
+
+    profiler = cProfile.Profile() if args.profile else None
+    results = {}
+    for duration in args.durations:
+        if args.stub:
+            if args.replay:
+                stderr_path = Path(args.replay) / f'tones_{duration}s.stderr'
+            else:
+                stderr_path = workdir / f'tones_{duration}s.stderr'
+                synthesize_stderr(stderr_path, duration)
+            cases = {'stub': lambda: ReplayExtractor(suite_config({}), stderr_path)}
+            media_path = stderr_path
+        else:
+            media_path = workdir / f'tones_{duration}s.m4a'
+            print(f"Generating {media_path} ...", file=sys.stderr)
+            generate_audio_fixture(args.ffmpeg, media_path, duration)
+            cases = {
+                name: (lambda o=overrides: VideoChapterExtractor(suite_config(o, telemetry=True)))
+                for name, overrides in PIPELINES.items()
+            }
+
+        for name, make_extractor in cases.items():
+            if profiler:
+                profiler.enable()
+            result = run_case(make_extractor, media_path, duration, trace_memory=args.stub)
+            if profiler:
+                profiler.disable()
+            results[f'{name}/{duration}s'] = result
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'case':<22}{'wall (s)':>10}{'x realtime':>12}{'py peak':>9}{'ff peak':>9}"
+              f"{'recall':>8}{'prec.':>7}{'err (s)':>9}")
+        for key, r in results.items():
+            print(f"{key:<22}{r['elapsed']:>10.3f}{r['throughput']:>12.1f}"
+                  f"{format_bytes(r['python_peak_bytes']):>9}{format_bytes(r['ffmpeg_peak_rss_bytes']):>9}"
+                  f"{r['recall']:>8.3f}{r['precision']:>7.3f}{r['mean_error']:>9.3f}")
+
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\n*** REGRESSION ***", file=sys.stderr)
+            for problem in problems:
+                print(f"  {problem}", file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions against baseline.", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Persistent cache of raw silence detection results.
+
+The raw silence list only depends on the video file and the detection
+parameters, so post-processing settings (adaptive ratio, min_gap, chapter
+prefix, ...) can be tuned without decoding the video again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+class SilenceCache:
+    """SQLite-backed cache of silence segments with LRU eviction."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS silences (
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            duration REAL NOT NULL,
+            segments TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (path, size, mtime_ns, params)
+        )
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 5000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(self.SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON silences (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _fingerprint(video_path: str) -> Tuple[str, int, int]:
+        """Identify a file by resolved path, size and modification time."""
+        stat = os.stat(video_path)
+        return str(Path(video_path).resolve()), stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _params_key(params: Dict[str, Any]) -> str:
+        return json.dumps(params, sort_keys=True)
+
+    def get(self, video_path: str, params: Dict[str, Any]
+            ) -> Optional[Tuple[float, List[Tuple[float, float, float]], Optional[List[float]]]]:
+        """Return (duration, [(start, end, duration), ...], scene times or None) or None on a miss."""
+        key = self._fingerprint(video_path) + (self._params_key(params),)
+
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT duration, segments FROM silences "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND params = ?",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE silences SET last_used = ? "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND params = ?",
+                (time.time(),) + key
+            )
+
+        duration, segments = row
+        data = json.loads(segments)
+        # 带场景切换时间的条目以对象保存，旧条目只有静音段列表
+        scenes = None
+        if isinstance(data, dict):
+            scenes = data['scenes']
+            data = data['silences']
+        return duration, [tuple(seg) for seg in data], scenes
+
+    def put(self, video_path: str, params: Dict[str, Any], duration: float,
+            segments: List[Tuple[float, float, float]], scenes: Optional[List[float]] = None):
+        """Store the silence list (and scene times) for a file and evict least recently used entries."""
+        path, size, mtime_ns = self._fingerprint(video_path)
+        data = [list(seg) for seg in segments]
+        if scenes is not None:
+            data = {'silences': data, 'scenes': scenes}
+
+        with self._lock, self._connect() as conn:
+            # 同一文件的旧版本（大小或修改时间不同）已无用，直接删除
+            conn.execute(
+                "DELETE FROM silences WHERE path = ? AND (size != ? OR mtime_ns != ?)",
+                (path, size, mtime_ns)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO silences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, self._params_key(params), duration,
+                 json.dumps(data), time.time())
+            )
+            conn.execute(
+                "DELETE FROM silences WHERE rowid NOT IN "
+                "(SELECT rowid FROM silences ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
@@ -0,0 +1,185 @@
+"""
+Constant-memory statistics and chapter emission for the streaming pipeline.
+
+The batch pipeline sorts every silence duration to find the quartiles used by
+the adaptive threshold. In streaming mode the quartiles are estimated online
+with the P-square algorithm (Jain & Chlamtac, 1985) and only the largest
+durations are kept, so memory stays constant however long the input runs.
+Chapter marks are emitted as soon as a silence passes the current threshold.
+"""
+
+import heapq
+from collections import deque
+from typing import List, Optional
+
+class P2Quantile:
+    """Online estimate of a single quantile using five markers."""
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        self.count += 1
+        q = self.heights
+
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find the cell containing x, extending the extremes if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = candidate
+                n[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float:
+        """Current estimate (exact while fewer than six values have been seen)."""
+        if not self.heights:
+            return 0.0
+        if self.count <= 5:
+            return self.heights[min(int(self.count * self.p), self.count - 1)]
+        return self.heights[2]
+
+class StreamingAdaptiveThreshold:
+    """Online counterpart of VideoChapterExtractor.calculate_adaptive_threshold."""
+
+    def __init__(self, min_silence: float, adaptive_ratio: float, top_k: int = 64):
+        self.min_silence = min_silence
+        self.adaptive_ratio = max(0.0, min(1.0, adaptive_ratio))
+        self.q1 = P2Quantile(0.25)
+        self.median = P2Quantile(0.5)
+        self.q3 = P2Quantile(0.75)
+        self.top_k = top_k
+        self.largest: List[float] = []
+
+    def add(self, duration: float):
+        self.q1.add(duration)
+        self.median.add(duration)
+        self.q3.add(duration)
+        if len(self.largest) < self.top_k:
+            heapq.heappush(self.largest, duration)
+        else:
+            heapq.heappushpop(self.largest, duration)
+
+    def reference_duration(self) -> float:
+        """Largest duration inside the IQR outlier bounds, or the median."""
+        if self.median.count < 4:
+            return self.median.value()
+
+        q1, q3 = self.q1.value(), self.q3.value()
+        iqr = q3 - q1
+        lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        normal = [d for d in self.largest if lower <= d <= upper]
+        if normal:
+            return max(normal)
+        # 所有保留的最大值都是异常值时，正常范围的最大值位于 Q3 与上界之间
+        if len(self.largest) == self.top_k:
+            return q3
+        return self.median.value()
+
+    def value(self) -> float:
+        if not self.median.count:
+            return self.min_silence
+        return max(self.min_silence, self.reference_duration() * self.adaptive_ratio)
+
+class ProvisionalChapters:
+    """Emit chapter times while silences are still arriving in time order.
+
+    The first ``warmup`` silences are held back until the threshold estimate
+    has settled; afterwards each silence is judged on arrival, so a chapter
+    already emitted is never withdrawn. Only the warm-up buffer is kept.
+    """
+
+    def __init__(self, min_silence: float, adaptive_ratio: Optional[float] = None,
+                 safety_ratio: float = 0.10, min_gap: float = 5.0, skip_head: float = 2.0,
+                 skip_tail: float = 2.0, duration: Optional[float] = None, warmup: int = 8):
+        # adaptive_ratio = None 表示不启用自适应阈值，直接使用 min_silence
+        self.threshold = (StreamingAdaptiveThreshold(min_silence, adaptive_ratio)
+                          if adaptive_ratio is not None else None)
+        self.min_silence = min_silence
+        self.safety_ratio = safety_ratio
+        self.min_gap = min_gap
+        self.skip_head = skip_head
+        self.skip_tail = skip_tail
+        self.duration = duration
+        self.warmup = warmup
+        self.pending = deque()
+        self.last_mark = 0.0
+        self.count = 0
+
+    def current_threshold(self) -> float:
+        return self.threshold.value() if self.threshold else self.min_silence
+
+    def _judge(self, end: float, duration: float) -> Optional[float]:
+        if duration < self.current_threshold():
+            return None
+
+        chapter_time = end - self.safety_ratio * duration
+        if chapter_time < self.skip_head:
+            return None
+        if self.duration is not None and chapter_time > self.duration - self.skip_tail:
+            return None
+        if chapter_time - self.last_mark < self.min_gap:
+            return None
+
+        self.last_mark = chapter_time
+        return chapter_time
+
+    def _drain(self) -> List[float]:
+        marks = []
+        while self.pending:
+            mark = self._judge(*self.pending.popleft())
+            if mark is not None:
+                marks.append(mark)
+        return marks
+
+    def add(self, end: float, duration: float) -> List[float]:
+        """Feed the next silence; returns the chapter times that became final."""
+        self.count += 1
+        if self.threshold:
+            self.threshold.add(duration)
+
+        self.pending.append((end, duration))
+        if self.count < self.warmup:
+            return []
+        return self._drain()
+
+    def finish(self) -> List[float]:
+        """Flush silences still held back when the input ended early."""
+        return self._drain()
@@ -0,0 +1,239 @@
+"""
+Progress and performance telemetry for FFmpeg child processes.
+
+FFmpeg is started with ``-progress pipe:2 -stats_period N`` so it writes
+``key=value`` blocks (``out_time_us``, ``speed``, ``fps``, ...) next to its
+normal log output. The blocks are parsed incrementally into a JobStats per
+process, which tracks the realtime factor, ETA, wall time and, where the
+platform allows, CPU time and peak RSS. Progress is logged at a fixed
+interval; finished jobs are appended to a JSONL file and summarised in a
+Prometheus textfile-collector file.
+
+CPU time and peak RSS are sampled from psutil when it is installed, otherwise
+from /proc on Linux; elsewhere they are reported as null.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import IO, Dict, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def progress_args(stats_period: float = 1.0) -> List[str]:
+    """Global FFmpeg options that write progress blocks to stderr."""
+    return ['-progress', 'pipe:2', '-stats_period', str(stats_period)]
+
+def sample_process(pid: int) -> Tuple[Optional[float], Optional[int]]:
+    """Return (CPU seconds, peak RSS bytes) of a running process, if available."""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        except psutil.Error:
+            return None, None
+
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # 进程名可能包含空格，从最后一个 ')' 之后开始按字段拆分
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        peak = None
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+                    break
+        return cpu, peak
+    except (OSError, ValueError, IndexError):
+        return None, None
+
+@dataclass
+class JobStats:
+    """Progress and resource usage of one FFmpeg process."""
+    job: str
+    kind: str
+    media_duration: Optional[float] = None
+    out_time: float = 0.0
+    speed: Optional[float] = None
+    fps: Optional[float] = None
+    started: float = field(default_factory=time.time)
+    wall: float = 0.0
+    cpu: Optional[float] = None
+    peak_rss: Optional[int] = None
+    status: str = 'running'
+
+    @property
+    def realtime_factor(self) -> Optional[float]:
+        """Seconds of media processed per second of wall time."""
+        return self.out_time / self.wall if self.wall > 0 and self.out_time > 0 else None
+
+    @property
+    def eta(self) -> Optional[float]:
+        factor = self.realtime_factor
+        if not factor or not self.media_duration:
+            return None
+        return max(0.0, self.media_duration - self.out_time) / factor
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['realtime_factor'] = self.realtime_factor
+        data['eta'] = self.eta
+        return data
+
+class ProgressParser:
+    """Incremental parser for FFmpeg ``-progress`` key=value blocks."""
+
+    def __init__(self, stats: JobStats, pid: Optional[int] = None):
+        self.stats = stats
+        self.pid = pid
+        self.clock = time.perf_counter()
+        self.reader: Optional[threading.Thread] = None
+
+    def feed(self, line: str) -> bool:
+        """Parse one line; returns True if it was a progress line."""
+        key, sep, value = line.strip().partition('=')
+        if not sep or ' ' in key:
+            return False
+
+        stats = self.stats
+        try:
+            # out_time_ms 实际上也是微秒，与 out_time_us 相同
+            if key in ('out_time_us', 'out_time_ms'):
+                stats.out_time = max(stats.out_time, int(value) / 1e6)
+            elif key == 'speed':
+                stats.speed = float(value.rstrip('x'))
+            elif key == 'fps':
+                stats.fps = float(value)
+            elif key == 'progress':
+                self.sample()
+            elif key not in ('frame', 'bitrate', 'total_size', 'out_time', 'dup_frames',
+                             'drop_frames', 'stream_0_0_q') and not key.startswith('stream_'):
+                return False
+        except ValueError:
+            # N/A 等无法解析的值直接忽略
+            pass
+        return True
+
+    def sample(self):
+        """Update wall time and, while the process runs, CPU time and peak RSS."""
+        self.stats.wall = time.perf_counter() - self.clock
+        if self.pid is not None:
+            cpu, rss = sample_process(self.pid)
+            if cpu is not None:
+                self.stats.cpu = cpu
+            if rss is not None:
+                self.stats.peak_rss = max(self.stats.peak_rss or 0, rss)
+
+class Telemetry:
+    """Collects JobStats, logs live progress and writes JSONL/Prometheus output."""
+
+    def __init__(self, logger, jsonl_path: Optional[str] = None,
+                 prometheus_path: Optional[str] = None, console_interval: float = 5.0,
+                 stats_period: float = 1.0, prefix: str = 'mpvchapter'):
+        self.logger = logger
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.console_interval = console_interval
+        self.stats_period = stats_period
+        self.prefix = prefix
+        self.finished: List[JobStats] = []
+        self._lock = threading.Lock()
+
+    def start(self, job: str, kind: str, pid: Optional[int],
+              media_duration: Optional[float] = None) -> ProgressParser:
+        return ProgressParser(JobStats(job, kind, media_duration), pid)
+
+    def feed(self, parser: ProgressParser, line: str) -> bool:
+        """Feed one stderr line; logs progress at most every console_interval seconds."""
+        before = parser.stats.wall
+        if not parser.feed(line):
+            return False
+        stats = parser.stats
+        if int(stats.wall / self.console_interval) > int(before / self.console_interval):
+            self.logger.info(self.format_progress(stats))
+        return True
+
+    def follow(self, parser: ProgressParser, stream: IO[bytes]):
+        """Read a binary stderr stream to the end in a background thread."""
+        def read():
+            for raw in stream:
+                self.feed(parser, raw.decode('utf-8', 'replace'))
+
+        parser.reader = threading.Thread(target=read, daemon=True)
+        parser.reader.start()
+
+    @staticmethod
+    def format_progress(stats: JobStats) -> str:
+        position = f"{stats.out_time:.0f}s"
+        if stats.media_duration:
+            percent = min(100.0, 100.0 * stats.out_time / stats.media_duration)
+            position += f"/{stats.media_duration:.0f}s ({percent:.0f}%)"
+        factor = stats.realtime_factor
+        parts = [f"{stats.kind} {stats.job}: {position}"]
+        if factor:
+            parts.append(f"{factor:.1f}x realtime")
+        if stats.eta is not None:
+            parts.append(f"ETA {stats.eta:.0f}s")
+        return ', '.join(parts)
+
+    def finish(self, parser: ProgressParser, success: bool):
+        """Record a finished job in the JSONL and Prometheus outputs."""
+        if parser.reader:
+            parser.reader.join()
+        stats = parser.stats
+        stats.wall = time.perf_counter() - parser.clock
+        stats.status = 'done' if success else 'failed'
+
+        cpu = f", CPU {stats.cpu:.1f}s" if stats.cpu is not None else ""
+        rss = f", peak RSS {stats.peak_rss / 2**20:.0f} MiB" if stats.peak_rss else ""
+        factor = f", {stats.realtime_factor:.1f}x realtime" if stats.realtime_factor else ""
+        self.logger.info(f"{stats.kind} {stats.job}: wall {stats.wall:.1f}s{cpu}{rss}{factor}")
+
+        with self._lock:
+            self.finished.append(stats)
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(stats.to_dict(), ensure_ascii=False) + '\n')
+            if self.prometheus_path:
+                self._write_prometheus()
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _write_prometheus(self):
+        """Rewrite the textfile with the latest run of every job (caller holds the lock)."""
+        latest = {}
+        for stats in self.finished:
+            latest[(stats.job, stats.kind)] = stats
+
+        metrics = [
+            ('wall_seconds', 'Wall-clock time of the FFmpeg process', lambda s: s.wall),
+            ('cpu_seconds', 'CPU time of the FFmpeg process', lambda s: s.cpu),
+            ('peak_rss_bytes', 'Peak resident set size of the FFmpeg process', lambda s: s.peak_rss),
+            ('media_seconds', 'Media time processed', lambda s: s.out_time),
+            ('realtime_factor', 'Media seconds processed per wall second', lambda s: s.realtime_factor),
+            ('success', 'Whether the FFmpeg process succeeded', lambda s: int(s.status == 'done')),
+        ]
+        lines = []
+        for name, help_text, getter in metrics:
+            metric = f"{self.prefix}_job_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for (job, kind), stats in sorted(latest.items()):
+                value = getter(stats)
+                if value is not None:
+                    lines.append(f'{metric}{{job="{self._escape(job)}",kind="{kind}"}} {value}')
+
+        # node_exporter 可能随时读取，先写临时文件再替换
+        tmp_path = self.prometheus_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
@@ -0,0 +1,206 @@
+"""
+Watch a directory for new or changed videos.
+
+On Linux the directory is watched through inotify (called through ctypes, so
+no extra package is needed); elsewhere, or when inotify is unavailable, the
+directory is polled with os.scandir. Files present when watching starts are
+not reported. A changed file is reported only after its size and
+modification time have stayed the same for ``settle`` seconds, so recordings
+and copies that are still being written are not picked up half-finished.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# inotify 事件掩码，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+class _InotifySource:
+    """File names changed in a directory, read from inotify."""
+
+    name = 'inotify'
+
+    def __init__(self, directory: Path):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout: float) -> Optional[Set[str]]:
+        """Names changed within timeout seconds; None if events were lost."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        names = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name and not mask & IN_ISDIR:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class _PollingSource:
+    """File names changed in a directory, found by comparing os.scandir snapshots."""
+
+    name = 'polling'
+
+    def __init__(self, directory: Path, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return snapshot
+
+    def read(self, timeout: float) -> Optional[Set[str]]:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {name for name, state in snapshot.items() if self.snapshot.get(name) != state}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+class FolderWatcher:
+    """Reports files of a directory once they were created or changed and then settled."""
+
+    def __init__(self, directory: Path, match: Callable[[str], bool], settle: float = 5.0,
+                 poll_interval: float = 2.0, backend: str = 'auto', logger=None):
+        self.directory = Path(directory)
+        self.match = match
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.source = self._open_source(backend)
+        self.started = time.time()
+        # 尚未稳定的文件: 路径 -> (大小, 修改时间, 最近一次变化的时间)
+        self.pending: Dict[Path, Tuple[int, int, float]] = {}
+
+    @property
+    def backend(self) -> str:
+        return self.source.name
+
+    def _open_source(self, backend: str):
+        if backend in ('auto', 'inotify'):
+            try:
+                return _InotifySource(self.directory)
+            except (OSError, AttributeError) as e:
+                if backend == 'inotify':
+                    raise
+                if self.logger:
+                    self.logger.info(f"inotify unavailable ({e}), polling every {self.poll_interval}s")
+        return _PollingSource(self.directory, self.poll_interval)
+
+    def _wanted(self, name: str) -> bool:
+        # 隐藏文件和临时文件（包括本程序自己写的）不处理
+        return not name.startswith('.') and not name.endswith('.tmp') and self.match(name)
+
+    def _rescan(self) -> Set[str]:
+        """Names modified since watching started, used after inotify lost events."""
+        names = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime >= self.started:
+                        names.add(entry.name)
+                except OSError:
+                    continue
+        return names
+
+    def _settled(self) -> List[Path]:
+        """Move pending files whose size and mtime stayed unchanged for settle seconds."""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                # 已被删除或改名（例如写完后重命名的临时文件）
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle and stat.st_size > 0:
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+    def watch(self, stop: threading.Event) -> Iterator[Path]:
+        """Yield settled files until stop is set."""
+        try:
+            while not stop.is_set():
+                # 有文件等待稳定时缩短等待时间，以便及时检查
+                timeout = min(self.settle, 0.5) if self.pending else 1.0
+                names = self.source.read(timeout)
+                if names is None:
+                    if self.logger:
+                        self.logger.warning("inotify event queue overflowed, rescanning directory")
+                    names = self._rescan()
+
+                now = time.monotonic()
+                for name in names:
+                    path = self.directory / name
+                    if self._wanted(name) and path not in self.pending:
+                        self.pending[path] = (-1, -1, now)
+
+                for path in self._settled():
+                    yield path
+        finally:
+            self.source.close()
@@ -0,0 +1,101 @@
+"""
+JSON-lines request loop for the persistent worker mode.
+
+Each line read from the input is one JSON object; the handler's result is
+written back as one JSON line carrying the request's ``id``, so a client
+(for example an mpv script) can keep a single warm process and send it
+requests as files are opened. With several jobs, requests run concurrently
+and responses may arrive out of order.
+
+Built-in operations: ``{"op": "ping"}`` answers ``{"ok": true, "op": "pong"}``
+and ``{"op": "shutdown"}`` ends the loop after the pending requests. The
+loop also ends at end of input.
+"""
+
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TextIO
+
+Request = Dict[str, Any]
+
+class JsonLinesWorker:
+    """Reads requests line by line and writes one response line per request."""
+
+    def __init__(self, handle: Callable[[Request], Dict[str, Any]], jobs: int = 1,
+                 stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None, logger=None):
+        self.handle = handle
+        self.jobs = max(1, jobs)
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.logger = logger
+        self._write_lock = threading.Lock()
+        # 限制同时等待的请求数，读取速度不超过处理速度
+        self._slots = threading.BoundedSemaphore(self.jobs * 2)
+
+    def respond(self, response: Dict[str, Any]):
+        line = json.dumps(response, ensure_ascii=False)
+        with self._write_lock:
+            self.stdout.write(line + '\n')
+            self.stdout.flush()
+
+    @staticmethod
+    def _tagged(request: Request, response: Dict[str, Any]) -> Dict[str, Any]:
+        if 'id' in request:
+            return {'id': request['id'], **response}
+        return response
+
+    def _run(self, request: Request):
+        try:
+            response = self.handle(request)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Request failed: {e}")
+            response = {'ok': False, 'error': str(e)}
+        self.respond(self._tagged(request, response))
+
+    def _run_slot(self, request: Request):
+        try:
+            self._run(request)
+        finally:
+            self._slots.release()
+
+    def serve(self) -> int:
+        """Handle requests until shutdown or end of input; return the number handled."""
+        handled = 0
+        shutdown = None
+        executor = ThreadPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        try:
+            for line in self.stdin:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    self.respond({'ok': False, 'error': f"Invalid request: {e}"})
+                    continue
+
+                op = request.get('op', 'chapters')
+                if op == 'shutdown':
+                    shutdown = request
+                    break
+                if op == 'ping':
+                    self.respond(self._tagged(request, {'ok': True, 'op': 'pong'}))
+                    continue
+
+                handled += 1
+                if executor is None:
+                    self._run(request)
+                else:
+                    self._slots.acquire()
+                    executor.submit(self._run_slot, request)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+        if shutdown is not None:
+            self.respond(self._tagged(shutdown, {'ok': True, 'op': 'shutdown'}))
+        return handled
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the adaptive scheduler against the fixed worker pool.
+
+Generates a mix of short low-resolution clips and longer high-resolution
+videos with FFmpeg's lavfi sources, then re-encodes the whole set once with
+the old fixed pool (max_workers=4) and once with the adaptive schedule,
+reporting the wall-clock time of each batch.
+
+Usage:
+    python benchmark.py [--workdir bench_media] [--scale 1.0]
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import video_reencoder
+from job_runner import JobRunner
+from video_reencoder import JOB_LIMITS, available_cores, batch_process_videos, plan_schedule
+
+# (name, width, height, seconds) of the generated inputs
+FIXTURES = [
+    ('clip_480p_a', 854, 480, 20),
+    ('clip_480p_b', 854, 480, 20),
+    ('clip_480p_c', 854, 480, 20),
+    ('clip_720p_a', 1280, 720, 30),
+    ('clip_720p_b', 1280, 720, 30),
+    ('talk_1080p', 1920, 1080, 60),
+    ('demo_2160p', 3840, 2160, 20),
+]
+
+# Batches to compare: name -> max_workers (None = adaptive schedule)
+MODES = {
+    'fixed-4': 4,
+    'adaptive': None,
+}
+
+def generate_fixture(ffmpeg, path, width, height, duration):
+    """Generate a test video with a moving pattern and a tone."""
+    if path.exists():
+        return
+
+    cmd = [
+        ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        # MPEG-4 Part 2 so every input is classified as needing a re-encode
+        '-c:v', 'mpeg4', '-q:v', '5',
+        '-c:a', 'aac',
+        str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+def run_mode(max_workers, input_dir, output_dir):
+    """Time one batch, starting from an empty output directory."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    # 每种模式使用新的 runner，限流记录和停止状态不会带到下一种模式
+    video_reencoder.RUNNER = JobRunner(JOB_LIMITS)
+    start = time.perf_counter()
+    batch_process_videos(str(input_dir), str(output_dir), max_workers=max_workers)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workdir', default='bench_media',
+                        help='directory for generated fixtures and outputs')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply every fixture duration by this factor')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='FFmpeg executable')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir)
+    input_dir = workdir / 'input'
+    input_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, width, height, seconds in FIXTURES:
+        path = input_dir / f'{name}_{args.scale:g}x.mp4'
+        print(f"Generating {path} ...", file=sys.stderr)
+        generate_fixture(args.ffmpeg, path, width, height, max(1, int(seconds * args.scale)))
+
+    budget = available_cores()
+    jobs = plan_schedule([str(p) for p in sorted(input_dir.glob('*.mp4'))], budget)
+
+    results = []
+    for name, max_workers in MODES.items():
+        elapsed = run_mode(max_workers, input_dir, workdir / f'output_{name}')
+        results.append({'mode': name, 'elapsed': elapsed})
+
+    if args.json:
+        print(json.dumps({'cores': budget, 'schedule': jobs, 'results': results}, indent=2))
+        return
+
+    print(f"\nAvailable cores: {budget}")
+    print(f"{'mode':<12}{'wall (s)':>10}{'speedup':>10}")
+    baseline = results[0]['elapsed']
+    for r in results:
+        print(f"{r['mode']:<12}{r['elapsed']:>10.2f}{baseline / r['elapsed']:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
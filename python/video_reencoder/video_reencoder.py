@@ -1,51 +1,647 @@
+import hashlib
+import json
+import logging
 import os
+import queue
+import shutil
 import subprocess
+import sys
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 
-def process_video(input_file, output_dir):
-    """处理单个视频文件"""
+# 与 mpvchapter 共用文件发现、ffprobe 元数据服务和探测缓存
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mpvchapter'))
+from discovery import discover
+from job_journal import DONE, FAILED, QUEUED, RUNNING, JobJournal
+from job_runner import JobKilled, JobRunner, ResourceLimits
+from media_probe import default_cache_path, shared_service
+from telemetry import Telemetry
+
+JOURNAL_NAME = ".reencode_journal.jsonl"
+# 任务日志中预览版已生成、正式编码尚未完成的状态
+PROXY = 'proxy'
+
+# 输入目录中（包括子目录）需要处理的文件，扩展名不区分大小写
+VIDEO_PATTERN = '*.{mp4,avi,mov,mkv,flv}'
+
+# libx264 每个任务的编码线程数（按视频高度）；超过这个数后单任务的加速比明显下降
+THREADS_BY_HEIGHT = [(480, 2), (720, 4), (1080, 6), (1440, 8)]
+THREADS_MAX = 12
+
+# 判断输入是否需要重新编码的规则
+EFFICIENCY_RULES = {
+    # 无需重新编码的视频编码
+    'codecs': ['h264'],
+    # 各分辨率（按高度）允许的最高视频码率 (bit/s)，超过则重新编码
+    'max_bitrate_by_height': [(480, 2500000), (720, 5000000), (1080, 8000000),
+                              (1440, 16000000), (2160, 40000000)],
+    # 超过该高度的视频总是重新编码，None 表示不限制
+    'max_height': None,
+    # 可以直接放入 MP4 的音频编码，其他音频在转封装时转为 AAC
+    'mp4_audio_codecs': ['aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus'],
+}
+
+# 本次没有重新编码的任务可供参考时，估算节省时间所用的编码速度
+# （像素 × 媒体秒 / 墙钟秒，约为 libx264 slow 编码 1080p 的 0.5 倍速）
+ASSUMED_ENCODE_RATE = 1920 * 1080 * 0.5
+
+# 两阶段模式中预览版的编码参数：速度优先，画质和体积次之
+PROXY_PRESET = 'ultrafast'
+PROXY_CRF = 28
+
+# 分段并行编码：时长不短于 CHUNK_MIN_DURATION 秒的文件在关键帧处切成约
+# CHUNK_SECONDS 秒的段，每段使用 CHUNK_THREADS 个编码线程，失败的段重试 CHUNK_RETRIES 次
+CHUNK_MIN_DURATION = 20 * 60
+CHUNK_SECONDS = 120
+CHUNK_THREADS = 4
+CHUNK_RETRIES = 1
+# 所有段使用相同的码率控制参数，拼接后画质一致
+QUALITY_CRF = 23
+
+# 需要调用编码器的处理方式
+ENCODE_ACTIONS = ('encode', 'chunked')
+
+# 每个 FFmpeg 进程的资源限制：默认降低 CPU 和 IO 优先级，避免抢占同一台机器上的媒体服务器；
+# 超过 JOB_TIMEOUT 秒或 STALL_TIMEOUT 秒没有 CPU 进展的进程连同子进程一起结束（None 表示不限制）
+JOB_LIMITS = ResourceLimits(
+    timeout=None,
+    stall_timeout=600,
+    nice=10,
+    ionice_class=2,
+    ionice_level=6,
+    memory_mb=None,
+)
+# 后台正式编码（两阶段模式）使用最低优先级，不占用 CPU 预算，以免挡住预览版的编码
+BACKGROUND_LIMITS = JOB_LIMITS.replace(nice=19, ionice_class=2, ionice_level=7, cpu_budget=None)
+
+# 控制台输出编码进度的间隔 (秒)，以及 FFmpeg 输出进度块的间隔 (秒)
+PROGRESS_INTERVAL = 10
+STATS_PERIOD = 1
+
+# 进度和性能数据与 mpvchapter 使用同一套实现，在 batch_process_videos 中配置输出路径
+LOGGER = logging.getLogger('video_reencoder')
+TELEMETRY = Telemetry(LOGGER, console_interval=PROGRESS_INTERVAL, stats_period=STATS_PERIOD,
+                      prefix='video_reencoder')
+# 各输入文件的时长 (秒)，用于计算进度百分比和 ETA
+DURATIONS = {}
+# 所有 FFmpeg 进程共用一个 CPU 预算（在 batch_process_videos 中按可用核心数设置）
+RUNNER = JobRunner(JOB_LIMITS)
+
+def configure_telemetry(jsonl_path=None, metrics_path=None, durations=None):
+    """设置 JSONL 和 Prometheus textfile 的输出路径以及各输入文件的时长"""
+    TELEMETRY.jsonl_path = jsonl_path
+    TELEMETRY.prometheus_path = metrics_path
+    DURATIONS.clear()
+    DURATIONS.update(durations or {})
+    if not LOGGER.handlers:
+        # 进度与其他输出一样直接打印到控制台
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('  %(message)s'))
+        LOGGER.addHandler(handler)
+        LOGGER.setLevel(logging.INFO)
+        LOGGER.propagate = False
+
+def settings_hash():
+    """影响输出的设置的哈希；设置改变后任务日志中已完成的记录失效"""
+    settings = {
+        'rules': EFFICIENCY_RULES,
+        'crf': QUALITY_CRF,
+        'proxy': [PROXY_PRESET, PROXY_CRF],
+        'chunks': [CHUNK_MIN_DURATION, CHUNK_SECONDS],
+    }
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_output_path(input_file, output_dir):
+    """构建输出文件路径"""
+    base_name = os.path.basename(input_file)
+    file_name, ext = os.path.splitext(base_name)
+    # output_name = f"new-{file_name}.mp4"
+    output_name = f"{file_name}.mp4"
+    return os.path.join(output_dir, output_name)
+
+# 同时探测的文件数
+PROBE_WORKERS = 8
+
+def metadata_service():
+    """进程内共享的元数据服务，探测结果按文件指纹缓存在磁盘上，跨运行复用"""
+    return shared_service(default_cache_path(), PROBE_WORKERS)
+
+def video_info(info):
+    """把 MediaInfo 转为调度使用的字典，没有视频流时返回 None"""
+    video = info.video if info else None
+    if video is None or not video.width or not video.height or not info.duration:
+        return None
+    bit_rate = info.video_bit_rate
+    return {
+        'width': video.width,
+        'height': video.height,
+        'duration': info.duration,
+        'video_codec': video.codec_name,
+        'bit_rate': float(bit_rate) if bit_rate else None,
+        'audio_codecs': [st.codec_name for st in info.audio],
+    }
+
+def probe_video(input_file):
+    """获取编码、分辨率、码率和时长，失败时返回 None"""
+    return probe_videos([input_file])[input_file]
+
+def probe_videos(video_files):
+    """并发探测多个文件，返回 {文件: 信息或 None}"""
+    probed = metadata_service().probe_many(video_files)
+    return {f: video_info(probed.get(f)) for f in video_files}
+
+def classify(input_file, info, rules=EFFICIENCY_RULES):
+    """判断输入需要的处理方式: 'skip'、'remux'（-c copy 转封装）或 'encode'"""
+    if info is None or info['video_codec'] not in rules['codecs']:
+        return 'encode'
+
+    if rules['max_height'] and info['height'] > rules['max_height']:
+        return 'encode'
+
+    if info['bit_rate'] is None:
+        return 'encode'
+    limit = rules['max_bitrate_by_height'][-1][1]
+    for max_height, max_bitrate in rules['max_bitrate_by_height']:
+        if info['height'] <= max_height:
+            limit = max_bitrate
+            break
+    if info['bit_rate'] > limit:
+        return 'encode'
+
+    audio_ok = all(codec in rules['mp4_audio_codecs'] for codec in info['audio_codecs'])
+    if input_file.lower().endswith('.mp4') and audio_ok:
+        return 'skip'
+    return 'remux'
+
+def available_cores():
+    """CPU 核心数减去当前负载，至少为 1"""
+    cores = os.cpu_count() or 1
     try:
-        # 获取文件名和扩展名
-        base_name = os.path.basename(input_file)
-        file_name, ext = os.path.splitext(base_name)
-
-        # 构建输出文件名和路径
-        # output_name = f"new-{file_name}.mp4"
-        output_name = f"{file_name}.mp4"
-        output_path = os.path.join(output_dir, output_name)
-
-        # 构建FFmpeg命令
-        cmd = [
-            'ffmpeg',
-            '-i', input_file,
-            '-c:v', 'libx264',
-            '-preset', 'slow',
-            '-c:a', 'copy',
-            output_path
-        ]
-
-        # 执行命令
-        subprocess.run(cmd, check=True)
-        print(f"成功处理: {input_file} -> {output_path}")
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        # Windows 没有 getloadavg
+        load = 0.0
+    return max(1, int(cores - load + 0.5))
+
+def threads_for(height, budget):
+    """按分辨率决定单个任务的编码线程数"""
+    for max_height, threads in THREADS_BY_HEIGHT:
+        if height <= max_height:
+            return min(threads, budget)
+    return min(THREADS_MAX, budget)
+
+def plan_schedule(video_files, budget=None, rules=EFFICIENCY_RULES, chunked=False):
+    """预先探测所有文件，返回按预计耗时从长到短排序的任务列表
+
+    chunked 为 True 时，足够长的文件改为分段并行编码，占用全部 budget。
+
+    每个任务是 {'input', 'action', 'width', 'height', 'duration', 'cost',
+    'threads', 'audio_codec'}，cost 为像素数 × 时长，用作编码耗时的估计。
+    """
+    budget = budget or available_cores()
+    infos = probe_videos(video_files)
+    jobs = []
+    for f in video_files:
+        info = infos[f]
+        action = classify(f, info, rules)
+        if chunked and action == 'encode' and info and info['duration'] >= CHUNK_MIN_DURATION:
+            action = 'chunked'
+        # 探测失败的文件按 1080p、时长未知处理，排在最后
+        width, height, duration = ((info['width'], info['height'], info['duration'])
+                                   if info else (1920, 1080, 0.0))
+        audio_ok = info and all(c in rules['mp4_audio_codecs'] for c in info['audio_codecs'])
+        jobs.append({
+            'input': f,
+            'action': action,
+            'width': width,
+            'height': height,
+            'duration': duration,
+            'cost': width * height * duration,
+            # 转封装和跳过只涉及读写，一个线程即可
+            'threads': {'encode': threads_for(height, budget), 'chunked': budget}.get(action, 1),
+            'audio_codec': 'copy' if action in ENCODE_ACTIONS or audio_ok else 'aac',
+        })
+    # 重新编码的任务在前，其中最长任务优先 (LPT)，缩短整批的完成时间
+    jobs.sort(key=lambda job: (job['action'] in ENCODE_ACTIONS, job['cost']), reverse=True)
+    return jobs
+
+def print_schedule(jobs, budget):
+    """打印调度计划"""
+    print(f"调度计划: 可用核心 {budget} 个, 同时运行的任务数随线程数动态调整")
+    for job in jobs:
+        print(f"  {job['action']:<6} {job['threads']:>2} 线程  {job['width']}x{job['height']}  "
+              f"{job['duration']:>8.1f}s  {os.path.basename(job['input'])}")
+
+def print_report(jobs):
+    """打印各类任务的数量和跳过编码节省的时间（估算）"""
+    counts = {action: sum(1 for job in jobs if job['action'] == action)
+              for action in ('skip', 'remux', 'encode', 'chunked')}
+    print(f"分类结果: 跳过 {counts['skip']} 个, 转封装 {counts['remux']} 个, "
+          f"重新编码 {counts['encode'] + counts['chunked']} 个 (其中分段编码 {counts['chunked']} 个)")
+
+    saved_jobs = [job for job in jobs if job['action'] not in ENCODE_ACTIONS and job.get('ok')]
+    if not saved_jobs:
+        return
+
+    # 用本次实际编码的速度估算，没有编码任务时使用默认速度
+    encoded = [job for job in jobs if job['action'] in ENCODE_ACTIONS and job.get('ok') and job['cost']]
+    encode_seconds = sum(job['elapsed'] for job in encoded)
+    rate = sum(job['cost'] for job in encoded) / encode_seconds if encode_seconds else ASSUMED_ENCODE_RATE
+
+    avoided = sum(job['cost'] for job in saved_jobs) / rate
+    spent = sum(job['elapsed'] for job in saved_jobs)
+    print(f"节省编码时间约 {max(0.0, avoided - spent) / 60:.1f} 分钟 "
+          f"(重新编码预计 {avoided / 60:.1f} 分钟, 实际用时 {spent / 60:.1f} 分钟)")
+
+def run_job(job, output_dir, journal=None, threads=None):
+    """执行单个任务并记录用时"""
+    start = time.perf_counter()
+    job['ok'] = process_video(job['input'], output_dir, journal, threads,
+                              job['action'], job['audio_codec'], job.get('background', False))
+    job['elapsed'] = time.perf_counter() - start
+    return job['ok']
+
+def stop_pool(executor):
+    """Ctrl+C 时立即结束所有 FFmpeg 进程并取消尚未开始的任务
+
+    FFmpeg 在独立的进程组中运行，收不到终端的 Ctrl+C；退出 with 块时线程池
+    会等待所有任务，因此必须在退出之前先结束进程。
+    """
+    RUNNER.stop()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def run_schedule(jobs, budget, output_dir, journal=None, on_finish=None):
+    """按顺序启动任务，只要正在运行任务的线程总数不超过 budget 就继续启动
+
+    jobs 可以是任意可迭代对象（例如从队列读取的生成器）。每个任务结束后
+    调用 on_finish(job)。返回与 jobs 顺序一致的结果列表。
+    """
+    condition = threading.Condition()
+    in_use = [0]
+
+    def run(job):
+        try:
+            threads = job['threads'] if job['action'] in ENCODE_ACTIONS + ('proxy',) else None
+            ok = run_job(job, output_dir, journal, threads)
+            if on_finish:
+                on_finish(job)
+            return ok
+        finally:
+            with condition:
+                in_use[0] -= job['threads']
+                condition.notify_all()
+
+    futures = []
+    # 每个任务至少占用一个线程，同时运行的任务不会超过 budget 个
+    with ThreadPoolExecutor(max_workers=budget) as executor:
+        try:
+            for job in jobs:
+                with condition:
+                    # 没有任务运行时总是允许启动，避免单个任务超出预算而卡住
+                    condition.wait_for(lambda: in_use[0] == 0 or in_use[0] + job['threads'] <= budget)
+                    in_use[0] += job['threads']
+                futures.append(executor.submit(run, job))
+            return [future.result() for future in futures]
+        except KeyboardInterrupt:
+            stop_pool(executor)
+            raise
+
+def run_two_tier(jobs, budget, output_dir, journal=None, max_workers=None, proxied=()):
+    """两阶段处理：先为需要重新编码的文件快速生成预览版，正式编码在后台低优先级进行
+
+    每个预览版完成后立即把对应的正式编码放入后台队列，正式编码完成后原子替换
+    预览版。proxied 中的文件已有预览版，直接进入后台队列。返回
+    (结果列表, 最终任务列表)。
+    """
+    finals = queue.Queue()
+    interrupted = threading.Event()
+
+    def enqueue_final(job):
+        if job['action'] == 'proxy' and job['ok']:
+            # 正式编码使用原任务的线程数，而不是预览版限制后的线程数
+            finals.put(dict(job['final'], background=True))
+
+    def final_jobs():
+        while True:
+            job = finals.get()
+            # 中断后不再启动排队中的正式编码
+            if job is None or interrupted.is_set():
+                return
+            yield job
+
+    first_tier = []
+    for job in jobs:
+        if job['action'] not in ENCODE_ACTIONS:
+            first_tier.append(job)
+        elif job['input'] in proxied:
+            finals.put(dict(job, background=True))
+        else:
+            # 预览版只用单个进程快速编码
+            first_tier.append(dict(job, action='proxy', final=job,
+                                   threads=min(job['threads'], THREADS_MAX)))
+
+    final = []
+    with ThreadPoolExecutor(max_workers=1) as background:
+        def run_final():
+            return run_schedule(final_jobs(), budget, output_dir, journal,
+                                on_finish=final.append)
+
+        second = background.submit(run_final)
+        try:
+            try:
+                if max_workers:
+                    def run(job):
+                        ok = run_job(job, output_dir, journal)
+                        enqueue_final(job)
+                        return ok
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        try:
+                            list(executor.map(run, first_tier))
+                        except KeyboardInterrupt:
+                            stop_pool(executor)
+                            raise
+                else:
+                    run_schedule(first_tier, budget, output_dir, journal, on_finish=enqueue_final)
+                print("预览版已全部生成，正式编码在后台继续进行")
+            finally:
+                finals.put(None)
+            second.result()
+        except KeyboardInterrupt:
+            # 后台的正式编码已随 RUNNER.stop() 结束，不再等待其结果
+            interrupted.set()
+            stop_pool(background)
+            raise
+
+    done = [job for job in first_tier if job['action'] != 'proxy'] + final
+    # 预览版失败的文件不会进入后台队列，同样计为失败
+    failed_proxies = [job for job in first_tier if job['action'] == 'proxy' and not job['ok']]
+    results = [job['ok'] for job in done] + [False] * len(failed_proxies)
+    return results, done + [dict(job['final'], ok=False) for job in failed_proxies]
+
+def build_command(input_file, output_path, action='encode', threads=None, audio_codec='copy'):
+    """构建 FFmpeg 命令"""
+    cmd = [metadata_service().tools.ffmpeg, '-y', '-i', input_file]
+    if action == 'remux':
+        # 保留所有视频和音轨（默认只选一条音轨，多语言音轨会丢失）；
+        # MP4 不支持大多数字幕格式以及 MKV 的附件和数据流，转封装时丢弃
+        cmd.extend(['-map', '0', '-map', '-0:s', '-map', '-0:d', '-map', '-0:t',
+                    '-c:v', 'copy', '-c:a', audio_codec])
+    elif action == 'proxy':
+        cmd.extend(['-c:v', 'libx264', '-preset', PROXY_PRESET, '-crf', str(PROXY_CRF),
+                    '-c:a', audio_codec])
+        if threads:
+            cmd.extend(['-threads', str(threads)])
+    else:
+        cmd.extend(['-c:v', 'libx264', '-preset', 'slow', '-crf', str(QUALITY_CRF), '-c:a', audio_codec])
+        if threads:
+            cmd.extend(['-threads', str(threads)])
+    cmd.extend(['-f', 'mp4', output_path])
+    return cmd
+
+def run_ffmpeg(cmd, kind, threads=None, background=False):
+    """运行 FFmpeg 并通过 -progress pipe:1 解析 out_time、speed、fps
+
+    进程由 RUNNER 按资源限制启动，threads 个线程计入 CPU 预算，background 为 True
+    时使用最低优先级。TELEMETRY 定期输出进度、实时倍速和 ETA，结束后记录墙钟时间、
+    CPU 时间和峰值内存。失败时与 subprocess.run(check=True) 一样抛出
+    CalledProcessError；超时或无进展被结束时抛出 JobKilled。
+    """
+    cmd = cmd[:1] + ['-nostats', '-progress', 'pipe:1', '-stats_period', str(STATS_PERIOD)] + cmd[1:]
+
+    source = cmd[cmd.index('-i') + 1]
+    job = os.path.basename(source)
+    media_duration = DURATIONS.get(source)
+    if '-ss' in cmd:
+        start = float(cmd[cmd.index('-ss') + 1])
+        job += f"@{start:.0f}s"
+        media_duration = media_duration - start if media_duration else None
+    if '-t' in cmd:
+        media_duration = float(cmd[cmd.index('-t') + 1])
+
+    process = RUNNER.start(cmd, f"{kind} {job}", cpus=threads or 1,
+                           limits=BACKGROUND_LIMITS if background else None,
+                           stdout=subprocess.PIPE, text=True)
+    progress = TELEMETRY.start(job, kind, process.pid, media_duration)
+    try:
+        for line in process.stdout:
+            TELEMETRY.feed(progress, line)
+        process.wait()
+    finally:
+        # 提前退出（例如 Ctrl+C）时结束整个进程组
+        RUNNER.finish(process)
+        TELEMETRY.finish(progress, process.returncode == 0)
+
+    RUNNER.check(process)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    return progress.stats
+
+def copy_output(input_file, output_path):
+    """已经是合格 MP4 的文件: 尽量用硬链接，否则复制"""
+    if os.path.abspath(input_file) == os.path.abspath(output_path):
+        return
+    try:
+        os.link(input_file, output_path)
+    except OSError:
+        shutil.copy2(input_file, output_path)
+
+def find_keyframes(input_file):
+    """读取视频流关键帧的时间戳（只读取数据包，不解码）"""
+    cmd = [
+        metadata_service().tools.ffprobe, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        input_file
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) >= 2 and 'K' in fields[1] and fields[0] not in ('', 'N/A'):
+            keyframes.append(float(fields[0]))
+    keyframes.sort()
+    # ffmpeg 的 -ss 相对于文件起始时间，时间戳不从 0 开始时（如 MPEG-TS）需要减去起点
+    return [t - keyframes[0] for t in keyframes] if keyframes else []
+
+def plan_chunks(keyframes, duration, chunk_seconds=CHUNK_SECONDS):
+    """在关键帧处切分时间轴，返回 [(start, end), ...]，最后一段的 end 为 None（读到结尾）"""
+    boundaries = [0.0]
+    for t in keyframes:
+        # 末尾不足半段的部分并入最后一段
+        if t - boundaries[-1] >= chunk_seconds and duration - t >= chunk_seconds / 2:
+            boundaries.append(t)
+    return list(zip(boundaries, boundaries[1:] + [None]))
+
+def encode_chunk(input_file, chunk_path, start, end, threads=CHUNK_THREADS, background=False):
+    """只编码视频流的一段；输入端 -ss 定位到关键帧，保证各段首尾相接"""
+    temp_path = chunk_path + '.part'
+    cmd = [metadata_service().tools.ffmpeg, '-y', '-v', 'error', '-ss', f'{start:.6f}']
+    if end is not None:
+        cmd.extend(['-t', f'{end - start:.6f}'])
+    cmd.extend([
+        '-i', input_file,
+        '-map', '0:v:0', '-an', '-sn',
+        '-c:v', 'libx264', '-preset', 'slow', '-crf', str(QUALITY_CRF),
+        '-threads', str(threads),
+        '-f', 'mp4', temp_path
+    ])
+    try:
+        run_ffmpeg(cmd, 'chunk', threads, background)
+        os.replace(temp_path, chunk_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def encode_chunked(input_file, output_path, threads=None, audio_codec='copy', background=False):
+    """分段并行编码单个长视频，最后用 concat demuxer 拼接（不重新编码）
+
+    各段保存在 <output>.chunks 目录中，已完成的段在重新运行时直接复用，
+    所以失败或中断后只需重新编码未完成的段。源文件或编码设置改变后整个目录作废。
+    """
+    chunk_dir = output_path + '.chunks'
+    plan_path = os.path.join(chunk_dir, 'plan.json')
+    stat = os.stat(input_file)
+    source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'settings': settings_hash()}
+
+    # 切分方案保存下来，重新运行时各段边界保持不变
+    chunks = None
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        if isinstance(plan, dict) and all(plan.get(key) == value for key, value in source.items()):
+            chunks = [tuple(chunk) for chunk in plan['chunks']]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    if chunks is None:
+        # 旧的分段来自另一个版本的源文件或另一套设置，不能拼接进新的输出
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        os.makedirs(chunk_dir, exist_ok=True)
+        info = probe_video(input_file)
+        if info is None:
+            raise RuntimeError(f"无法探测视频信息: {input_file}")
+        chunks = plan_chunks(find_keyframes(input_file), info['duration'])
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(source, chunks=chunks), f)
+
+    chunk_paths = [os.path.join(chunk_dir, f'chunk_{i:04d}.mp4') for i in range(len(chunks))]
+    todo = [i for i, path in enumerate(chunk_paths) if not os.path.exists(path)]
+    workers = max(1, (threads or os.cpu_count() or 1) // CHUNK_THREADS)
+    name = os.path.basename(input_file)
+    print(f"分段编码 {name}: 共 {len(chunks)} 段, 待编码 {len(todo)} 段, 并行 {workers} 个进程")
+
+    def run(i):
+        start, end = chunks[i]
+        for attempt in range(CHUNK_RETRIES + 1):
+            began = time.perf_counter()
+            try:
+                encode_chunk(input_file, chunk_paths[i], start, end, background=background)
+            except (subprocess.CalledProcessError, JobKilled) as e:
+                print(f"  段 {i + 1}/{len(chunks)} 失败 (第 {attempt + 1} 次): {e}")
+                continue
+            elapsed = time.perf_counter() - began
+            length = f"{end - start:.0f}s" if end is not None else "到结尾"
+            print(f"  段 {i + 1}/{len(chunks)} 完成: 从 {start:.1f}s 起 {length}, 用时 {elapsed:.1f}s")
+            return elapsed
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        elapsed = list(executor.map(run, todo))
+
+    failed = [i + 1 for i, e in zip(todo, elapsed) if e is None]
+    if failed:
+        # 已完成的段保留在 .chunks 目录中，下次运行只重新编码失败的段
+        raise RuntimeError(f"{len(failed)} 个分段编码失败: {failed}")
+    if todo:
+        slowest = max(zip(elapsed, todo))
+        print(f"  最慢的段: {slowest[1] + 1}, 用时 {slowest[0]:.1f}s")
+
+    list_path = os.path.join(chunk_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in chunk_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    # 视频取拼接后的各段，音频直接从原文件复制，避免段边界处的音频缝隙
+    cmd = [
+        metadata_service().tools.ffmpeg, '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', input_file,
+        '-map', '0:v:0', '-map', '1:a?',
+        '-c:v', 'copy', '-c:a', audio_codec,
+        '-f', 'mp4', output_path
+    ]
+    run_ffmpeg(cmd, 'concat')
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+
+def record_failure(journal, input_file, error):
+    """在任务日志中记录失败；中断导致的失败保留原记录
+
+    停止后被结束的任务保持 running（后台正式编码保持 proxy）状态，
+    下次运行时计为中断并从原处继续，而不是当作失败。
+    """
+    if journal and not RUNNER.stopping:
+        journal.record(input_file, FAILED, str(error))
+
+def process_video(input_file, output_dir, journal=None, threads=None, action='encode',
+                  audio_codec='copy', background=False):
+    """处理单个视频文件
+
+    background 为 True 时以低优先级运行，完成后原子替换已有的输出（例如预览版）。
+    """
+    output_path = get_output_path(input_file, output_dir)
+    # 先写入临时文件，完成后再重命名，中断时不会留下写了一半的输出
+    temp_path = output_path + '.part'
+    try:
+        # 后台正式编码保留预览版记录，中断后重新运行时不必再生成预览版
+        if journal and not background:
+            journal.record(input_file, RUNNING)
+
+        if action == 'skip':
+            copy_output(input_file, temp_path)
+        elif action == 'chunked':
+            encode_chunked(input_file, temp_path, threads, audio_codec, background)
+        else:
+            cmd = build_command(input_file, temp_path, action, threads, audio_codec)
+            # 执行命令
+            run_ffmpeg(cmd, action, threads, background)
+        if os.path.exists(temp_path):
+            os.replace(temp_path, output_path)
+        if journal:
+            # 预览版不算完成，中断后重新运行时仍会进行正式编码
+            journal.record(input_file, PROXY if action == 'proxy' else DONE)
+        print(f"成功处理 ({action}): {input_file} -> {output_path}")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, JobKilled) as e:
         print(f"处理失败: {input_file}, 错误: {e}")
+        record_failure(journal, input_file, e)
         return False
     except Exception as e:
         print(f"发生意外错误: {input_file}, 错误: {e}")
+        record_failure(journal, input_file, e)
         return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def batch_process_videos(input_dir, output_dir, max_workers=None, two_tier=False, chunked=False,
+                         telemetry_path=None, metrics_path=None):
+    """批量处理视频文件
 
-def batch_process_videos(input_dir, output_dir, max_workers=4):
-    """批量处理视频文件"""
+    每个文件先按 EFFICIENCY_RULES 分为跳过、转封装或重新编码。
+    max_workers 为 None 时根据核心数、当前负载和各文件的分辨率自动调度；
+    指定整数时使用固定大小的线程池，每个 FFmpeg 自行决定线程数。
+    two_tier 为 True 时先为所有文件生成可观看的预览版，再在后台进行正式编码。
+    chunked 为 True 时，长视频在关键帧处切段并行编码后再拼接。
+    telemetry_path / metrics_path 指定时，每个 FFmpeg 进程的性能数据写入
+    JSONL 文件和 Prometheus textfile。
+    """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
     # 获取所有视频文件
-    video_files = []
-    for root, _, files in os.walk(input_dir):
-        for file in files:
-            if file.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv')):
-                video_files.append(os.path.join(root, file))
+    video_files = [str(p) for p in discover(input_dir, VIDEO_PATTERN, recursive=True)]
 
     if not video_files:
         print("未找到视频文件")
@@ -53,12 +649,62 @@ def batch_process_videos(input_dir, output_dir, max_workers=4):
 
     print(f"找到 {len(video_files)} 个视频文件待处理")
 
-    # 使用线程池并行处理
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(lambda f: process_video(f, output_dir), video_files))
+    # 任务日志放在输出目录，上次运行被中断时只处理未完成的文件
+    journal = JobJournal(os.path.join(output_dir, JOURNAL_NAME), settings_hash())
+    pending = [f for f in video_files
+               if not (journal.is_done(f) and os.path.exists(get_output_path(f, output_dir)))]
+    skipped = len(video_files) - len(pending)
+    # 上次运行已生成预览版的文件只需进行正式编码；必须在写入 queued 之前读取状态
+    proxied = {f for f in pending
+               if journal.state(f) == PROXY and os.path.exists(get_output_path(f, output_dir))}
+    interrupted = sum(1 for f in pending if journal.state(f) in (QUEUED, RUNNING, PROXY))
+    retried = sum(1 for f in pending if journal.state(f) == FAILED)
+    if skipped or interrupted or retried:
+        print(f"继续上次的任务: 跳过已完成 {skipped} 个, 重新处理中断 {interrupted} 个、失败 {retried} 个")
+    for f in pending:
+        # 保留预览版记录，再次中断后仍然只需正式编码
+        if f not in proxied:
+            journal.queued(f)
+
+    # 先探测所有文件，只有需要重新编码的文件才会调用编码器
+    budget = available_cores()
+    # 固定大小的线程池本身限制了并发，此时不再按 CPU 预算限流
+    RUNNER.limits = JOB_LIMITS.replace(cpu_budget=None if max_workers else budget)
+    jobs = plan_schedule(pending, budget, chunked=chunked)
+    configure_telemetry(telemetry_path, metrics_path,
+                        {job['input']: job['duration'] for job in jobs if job['duration']})
+    print_schedule(jobs, budget)
+
+    results = []
+    try:
+        if two_tier:
+            results, jobs = run_two_tier(jobs, budget, output_dir, journal, max_workers, proxied)
+        elif max_workers:
+            # 使用固定大小的线程池并行处理
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                try:
+                    results = list(executor.map(lambda job: run_job(job, output_dir, journal), jobs))
+                except KeyboardInterrupt:
+                    stop_pool(executor)
+                    raise
+        else:
+            results = run_schedule(jobs, budget, output_dir, journal)
+    except KeyboardInterrupt:
+        # 各线程池已结束 FFmpeg 进程，这里确保没有遗漏
+        print("已中断，FFmpeg 进程已结束")
+        RUNNER.stop()
+        raise
+    finally:
+        journal.close(completed=len(results) == len(pending) and all(results))
 
+    print_report(jobs)
+    summary = RUNNER.summary()
+    if summary:
+        print(f"受资源限制影响的 FFmpeg 进程 {len(summary)} 个:")
+        for line in summary:
+            print(f"  {line}")
     success_count = sum(results)
-    print(f"处理完成: 成功 {success_count} 个, 失败 {len(results)-success_count} 个")
+    print(f"处理完成: 成功 {success_count} 个, 失败 {len(results)-success_count} 个, 跳过 {skipped} 个")
 
 if __name__ == "__main__":
     # 设置输入和输出目录